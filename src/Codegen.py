@@ -0,0 +1,113 @@
+from src.DFA import CompiledDFA
+
+# Source of the generated modules, the tables being filled in by
+# generateSource. The lexing loop is the one of Scanner.tokens, for a whole
+# text given at once.
+TEMPLATE = '''"""
+	Lexer generated by Lexer.generate, do not edit.
+
+	lex(word) returns a list of (TOKEN, LEXEM) tuples or an error message, as
+	Lexer.lex does, and lex_offsets(word) returns (token index, start, end)
+	tuples, raising LexerError on errors.
+"""
+
+TOKENS = %(tokens)r
+# character -> column in the table
+COLUMNS = %(columns)r
+# ROWS[state][column] is the next state
+ROWS = %(rows)r
+# index of the token accepted by each state, -1 if the state is not final
+ACCEPTS = %(accepts)r
+SINK = %(sink)r
+
+class LexerError(Exception):
+	def __init__(self, position, line, column):
+		self.position = position
+		self.line = line
+		self.column = column
+		if position is None:
+			super().__init__(f'No viable alternative at character EOF, line {line}')
+		else:
+			super().__init__(f'No viable alternative at character {column}, line {line}')
+
+	@property
+	def message(self):
+		return self.args[0]
+
+def getLineColumn(word, position):
+	line = word.count("\\n", 0, position + 1)
+	lastNewline = word.rfind("\\n", 0, position + 1)
+	if lastNewline < 0:
+		return (line, position)
+	return (line, position - lastNewline)
+
+def lex_offsets(word):
+	columns = COLUMNS
+	rows = ROWS
+	accepts = ACCEPTS
+	sink = SINK
+	result = []
+	end = len(word)
+	# (state, position) pairs from which no token can be reached
+	failed = set()
+	trail = []
+	tokenStart = 0
+	while True:
+		i = tokenStart
+		state = 0
+		lexemeEnd = lexemeToken = -1
+		while True:
+			accept = accepts[state]
+			if i >= end:
+				if accept >= 0 and (i > tokenStart or end == 0):
+					lexemeEnd = i
+					lexemeToken = accept
+				if lexemeToken < 0:
+					raise LexerError(None, getLineColumn(word, end - 1)[0], None)
+				break
+			if lexemeToken >= 0 and (state, i) in failed:
+				break
+			column = columns.get(word[i])
+			if column is None:
+				line, column = getLineColumn(word, i)
+				raise LexerError(i, line, column)
+			if accept >= 0 and i > tokenStart:
+				lexemeEnd = i
+				lexemeToken = accept
+				trail.clear()
+			elif accept < 0:
+				trail.append((state, i))
+			if state == sink:
+				if lexemeToken < 0:
+					line, column = getLineColumn(word, i)
+					raise LexerError(i - 1, line, column - 1)
+				break
+			state = rows[state][column]
+			i += 1
+		failed.update(trail)
+		trail.clear()
+		result.append((lexemeToken, tokenStart, lexemeEnd))
+		tokenStart = lexemeEnd
+		if tokenStart >= end:
+			return result
+
+def lex(word):
+	try:
+		return [(TOKENS[token], word[start:end]) for (token, start, end) in lex_offsets(word)]
+	except LexerError as error:
+		return error.message
+'''
+
+# Generate the source of a standalone Python module lexing with a compiled
+# table, without any of the NFA or DFA construction.
+def generateSource(table: CompiledDFA) -> str:
+	width = table.width
+	transitions = table.transitions
+	rows = tuple(tuple(transitions[state * width:(state + 1) * width]) for state in range(table.size))
+	return TEMPLATE % {
+		"tokens": tuple(table.tokens),
+		"columns": table.columns,
+		"rows": rows,
+		"accepts": tuple(table.accepts),
+		"sink": table.sink,
+	}
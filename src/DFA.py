@@ -1,152 +1,598 @@
+import sys
+import array
+import struct
 from collections import defaultdict
-import copy
-import itertools
 from typing import Callable, Generic, TypeVar
-from src.NFA import NFA, NFANode
+from src.NFA import NFA, NFANode, CompactNFA, getLabelChars
 
 S = TypeVar("S")
 T = TypeVar("T")
 
-# dfa state (node) class
-class DFAState:
-	newid = itertools.count()
-	def __init__(self, NFAGroup: list[NFANode]):
-		self.id = next(DFAState.newid)
-		self.NFAGroup = NFAGroup
-		self.isInitial = False
-		self.isFinal = False
-
-# get all characters which are found in transitions in NFA graph
-def getAlphabet(NFAgraph: list[NFANode]) -> set[str]:
-	res = set()
-	for node in NFAgraph:
-		for transition in node.transitions:
-			# except "eps"
-			if transition[1] != "eps":
-				res.add(transition[1])
-	
+# Only the nodes with character transitions and the final nodes are kept in
+# DFA states, the others are just passed through by eps transitions and do not
+# change the behaviour of a state.
+def isImportant(nfa: CompactNFA, node: int) -> bool:
+	if nfa.isFinal(node):
+		return True
+	for k in range(nfa.offsets[node], nfa.offsets[node + 1]):
+		if nfa.labels[k] != 0:
+			return True
+	return False
+
+# Get the important nodes which can be accessed through eps transitions (the
+# node itself included). The closure of each node is computed once and cached
+# in closures, the search being iterative so long eps chains do not hit the
+# recursion limit.
+def getEpsClosure(nfa: CompactNFA, initialNode: int, closures: dict[int, frozenset[int]]) -> frozenset[int]:
+	res = closures.get(initialNode)
+	if res is not None:
+		return res
+
+	offsets = nfa.offsets
+	targets = nfa.targets
+	labels = nfa.labels
+	nodes = set()
+	visited = {initialNode}
+	stack = [initialNode]
+	while len(stack) > 0:
+		node = stack.pop()
+		if isImportant(nfa, node):
+			nodes.add(node)
+		for k in range(offsets[node], offsets[node + 1]):
+			target = targets[k]
+			if labels[k] != 0 or target in visited:
+				continue
+			visited.add(target)
+			# reuse closures which are already known instead of walking them
+			known = closures.get(target)
+			if known is not None:
+				nodes |= known
+			else:
+				stack.append(target)
+
+	res = frozenset(nodes)
+	closures[initialNode] = res
 	return res
 
-# Get nodes which can be accessed from initial given node by going to given
-# character transitions.
-def getCharTransitions(node: NFANode, char: str) -> list[NFANode]:
+# Get the transitions on characters of the NFA, as (node, characters, target)
+def getCharTransitions(nfa: CompactNFA) -> list[tuple[int, frozenset[str], int]]:
+	labelChars = [getLabelChars(label) for label in nfa.labelTable]
 	res = []
-	for transition in node.transitions:
-		if transition[1] == char:
-			res.append(transition[0])
-
+	for node in range(nfa.size):
+		for k in range(nfa.offsets[node], nfa.offsets[node + 1]):
+			chars = labelChars[nfa.labels[k]]
+			if len(chars) > 0:
+				res.append((node, chars, nfa.targets[k]))
 	return res
 
-# get nodes which can be accessed through eps transitions, recursively
-def getEpsTransitions(initialNode: NFANode, res: list[NFANode] = []) -> list[NFANode]:
-	res.append(initialNode)
-	for transition in initialNode.transitions:
-		if transition[1] == "eps" and (transition[0] not in res):
-			getEpsTransitions(transition[0], res)
+# Split the alphabet of the NFA in classes of characters which behave the same
+# in every DFA state, returning the class of each character.
+#
+# Every DFA state is a union of eps closures (of the initial node or of targets
+# of character transitions). Nodes found in exactly the same closures always
+# appear together, so they are grouped in atoms, and two characters are in the
+# same class when they lead from every atom to the same nodes.
+def getCharClasses(nfa: CompactNFA, closures: dict[int, frozenset[int]]) -> dict[str, int]:
+	charTransitions = getCharTransitions(nfa)
+	generators = {getEpsClosure(nfa, 0, closures)}
+	for (_, _, target) in charTransitions:
+		generators.add(getEpsClosure(nfa, target, closures))
+
+	membership: defaultdict[int, list[int]] = defaultdict(list)
+	for i, generator in enumerate(generators):
+		for node in generator:
+			membership[node].append(i)
+	atoms: dict[tuple[int, ...], int] = {}
+	atomOf: dict[int, int] = {}
+	for node, generatorIds in membership.items():
+		atomOf[node] = atoms.setdefault(tuple(generatorIds), len(atoms))
+
+	# nodes reached by each character from each atom
+	moves: defaultdict[str, defaultdict[int, set[int]]] = defaultdict(lambda: defaultdict(set))
+	for (node, chars, target) in charTransitions:
+		atom = atomOf.get(node)
+		if atom is not None:
+			targets = getEpsClosure(nfa, target, closures)
+			for char in chars:
+				moves[char][atom] |= targets
 
+	signatures: dict[frozenset, int] = {}
+	res = {}
+	for char in sorted(moves):
+		signature = frozenset((atom, frozenset(nodes)) for atom, nodes in moves[char].items())
+		res[char] = signatures.setdefault(signature, len(signatures))
 	return res
 
-# main function to build DFA transition table
-def toDFA(NFAGraph: list[NFANode]) -> defaultdict[str, list[DFAState]]:
-	transitionTable = defaultdict(list[DFAState])
+# Compact form of a DFA transition table. States are numbered from 0 (the
+# initial state) and the transitions are kept in a single flat list, the
+# transition of state s on character c being at s * width + columns[c].
+class CompiledDFA:
+	def __init__(self, columns: dict[str, int], width: int,
+				transitions: list[int], accepts: list[int], sink: int,
+				tokens: list[str] = None):
+		self.columns = columns # character -> column in the table
+		self.width = width
+		self.transitions = transitions
+		# index (in tokens) of the token accepted by each state, -1 if the state
+		# is not final
+		self.accepts = accepts
+		self.sink = sink # index of the sink state, -1 if there is none
+		self.tokens = [None] if tokens is None else tokens
+		# the states of a compiled table are never dropped (see LazyDFA)
+		self.flushes = 0
+
+	@property
+	def size(self) -> int:
+		return len(self.accepts)
+
+# Get the nodes reached from each node on each character class, eps closures
+# included.
+def getNodeMoves(nfa: CompactNFA, columns: dict[str, int], closures: dict[int, frozenset[int]]) -> dict[int, dict[int, set[int]]]:
+	nodeMoves: dict[int, dict[int, set[int]]] = {}
+	for (node, chars, target) in getCharTransitions(nfa):
+		labelColumns = {columns[char] for char in chars}
+		for column in labelColumns:
+			moves = nodeMoves.setdefault(node, {})
+			moves.setdefault(column, set()).update(getEpsClosure(nfa, target, closures))
+	return nodeMoves
+
+# Get the token accepted by a DFA state (as an index in the tokens priority
+# list), -1 if none. accepting holds the token index of each final node.
+def getAccept(group: frozenset[int], accepting: dict[int, int]) -> int:
+	accept = -1
+	for node in group:
+		tokenIndex = accepting.get(node)
+		if tokenIndex is not None and (accept < 0 or tokenIndex < accept):
+			accept = tokenIndex
+	return accept
+
+# Get the token index of each final node of the NFA, tokens being prioritized
+# in the given order.
+def getAccepting(nfa: CompactNFA, tokens: list[str]) -> dict[int, int]:
+	priority = {token: i for i, token in enumerate(tokens)}
+	return {node: priority[token] for (node, token) in nfa.tokens.items()}
+
+# Get the NFA group reached from a DFA state on a character class.
+def getGroupMove(group: frozenset[int], column: int, nodeMoves: dict[int, dict[int, set[int]]]) -> frozenset[int]:
+	targets = set()
+	for node in group:
+		moves = nodeMoves.get(node)
+		if moves is not None and column in moves:
+			targets |= moves[column]
+	return frozenset(targets)
+
+# Get the NFA groups reached from a DFA state on every character class, going
+# through the nodes of the group once.
+def getGroupMoves(group: frozenset[int], width: int, nodeMoves: dict[int, dict[int, set[int]]]) -> list[frozenset[int]]:
+	targets = [set() for _ in range(width)]
+	for node in group:
+		moves = nodeMoves.get(node)
+		if moves is not None:
+			for column, nodes in moves.items():
+				targets[column] |= nodes
+	return [frozenset(nodes) for nodes in targets]
+
+# main function to build DFA transition table, over character classes. When
+# several tokens are accepted by the same state, the first one in tokens wins.
+def toDFA(NFAGraph: CompactNFA | list[NFANode], tokens: list[str] = None) -> CompiledDFA:
+	nfa = NFAGraph if isinstance(NFAGraph, CompactNFA) else CompactNFA.fromGraph(NFAGraph)
+	if tokens is None:
+		tokens = [None]
+	accepting = getAccepting(nfa, tokens)
+	# eps closures of NFA nodes, shared by the whole construction
+	closures: dict[int, frozenset[int]] = {}
+
+	columns = getCharClasses(nfa, closures)
+	width = len(set(columns.values()))
+	nodeMoves = getNodeMoves(nfa, columns, closures)
 
 	# get eps transitions from initial node of NFA as initial step
-	initialState = DFAState(getEpsTransitions(NFAGraph[0], []))
-	initialState.isInitial = True # set the resulting DFA state as initial
-	# check if initial state is also final
-	for node in initialState.NFAGroup:
-		if node.isFinal:
-			initialState.isFinal = True
-	# append newly created initial state to final table
-	transitionTable["states"].append(initialState)
-
-	alphabet = getAlphabet(NFAGraph)
-
-	
-	for state in transitionTable["states"]:
-		for char in alphabet:
-			tmp = []
-			for node in state.NFAGroup:
-				if node.isFinal:
-					state.isFinal = True
-				tmp += getCharTransitions(node, char)
-		
-			tmpEps = []
-			for value in tmp:
-				tmpEps = getEpsTransitions(value, tmpEps)
-			# result NFA group in tmpEps
-			newState = None
-			addToEps = True
+	groups = [getEpsClosure(nfa, 0, closures)]
+	# DFA states indexed by their NFA group, so that a group reached again
+	# (in any order) maps to the same state
+	groupStates = {groups[0]: 0}
+	transitions: list[int] = []
+	accepts: list[int] = []
+	sink = -1
+
+	for state, group in enumerate(groups):
+		accepts.append(getAccept(group, accepting))
+		if len(group) == 0:
+			sink = state
+
+		for newGroup in getGroupMoves(group, width, nodeMoves):
 			# check if NFA group to add already has an associated DFA state
-			for checkState in transitionTable["states"]:
-				if checkState.NFAGroup == tmpEps:
-					newState = checkState
-					addToEps = False
-					break
+			newState = groupStates.get(newGroup)
 			if newState is None:
-				newState = DFAState(tmpEps)
+				newState = len(groups)
+				groupStates[newGroup] = newState
+				groups.append(newGroup)
+			transitions.append(newState)
+
+	return CompiledDFA(columns, width, transitions, accepts, sink, tokens)
+
+# Combine the DFAs of several tokens into the DFA of a lexer, the tokens being
+# prioritized in the order of the tables. Only the tuples of states reachable
+# from the initial one are built, the sinks of the tables (and characters
+# missing from their alphabets) leading to -1.
+def productDFA(tables: list[CompiledDFA], tokens: list[str]) -> CompiledDFA:
+	# the columns of a character in each table, characters with the same ones
+	# sharing a column
+	columns: dict[str, int] = {}
+	signatures: dict[tuple[int, ...], int] = {}
+	for table in tables:
+		for char in table.columns:
+			if char not in columns:
+				signature = tuple(other.columns.get(char, -1) for other in tables)
+				columns[char] = signatures.setdefault(signature, len(signatures))
+	width = len(signatures)
+
+	def getState(states):
+		return tuple(-1 if state == table.sink else state for (state, table) in zip(states, tables))
+
+	tuples = [getState([0] * len(tables))]
+	tupleStates = {tuples[0]: 0}
+	transitions: list[int] = []
+	accepts: list[int] = []
+	sink = -1
+	for state, states in enumerate(tuples):
+		accept = -1
+		for (i, (tokenState, table)) in enumerate(zip(states, tables)):
+			if tokenState >= 0 and table.accepts[tokenState] >= 0:
+				accept = i
+				break
+		accepts.append(accept)
+		if all(tokenState < 0 for tokenState in states):
+			sink = state
+
+		for signature in signatures:
+			newStates = getState([
+				table.transitions[tokenState * table.width + column] if tokenState >= 0 and column >= 0 else -1
+				for (tokenState, table, column) in zip(states, tables, signature)
+			])
+			newState = tupleStates.get(newStates)
+			if newState is None:
+				newState = len(tuples)
+				tupleStates[newStates] = newState
+				tuples.append(newStates)
+			transitions.append(newState)
+
+	return CompiledDFA(columns, width, transitions, accepts, sink, tokens)
+
+# Build the DFA reading the UTF-8 encoding of the words accepted by a compiled
+# DFA, one byte at a time, its columns being keyed by byte values. Characters
+# longer than a byte go through intermediate (not final) states, bytes which do
+# not continue any character leading to the sink.
+def toByteDFA(table: CompiledDFA) -> CompiledDFA:
+	width = table.width
+	# transitions of each state, as byte -> state
+	rows: list[dict[int, int]] = [{} for _ in range(table.size)]
+	accepts = list(table.accepts)
+	sink = table.sink
+	if sink < 0:
+		sink = len(rows)
+		rows.append({})
+		accepts.append(-1)
+
+	# surrogates have no UTF-8 encoding, so they never appear in a file
+	encodings = {char: char.encode("utf-8") for char in table.columns if not "\ud800" <= char <= "\udfff"}
+	for state in range(table.size):
+		# intermediate states reached from this state, by the bytes read
+		prefixes: dict[bytes, int] = {}
+		for char, encoding in encodings.items():
+			column = table.columns[char]
+			current = state
+			for i in range(len(encoding) - 1):
+				nextState = prefixes.get(encoding[:i + 1])
+				if nextState is None:
+					nextState = len(rows)
+					rows.append({})
+					accepts.append(-1)
+					prefixes[encoding[:i + 1]] = nextState
+				rows[current][encoding[i]] = nextState
+				current = nextState
+			rows[current][encoding[-1]] = table.transitions[state * width + column]
+
+	# bytes with the same transitions in every state share a column
+	signatures: dict[tuple[int, ...], int] = {}
+	columns: dict[int, int] = {}
+	for byte in sorted({byte for row in rows for byte in row}):
+		signature = tuple(row.get(byte, sink) for row in rows)
+		columns[byte] = signatures.setdefault(signature, len(signatures))
+	byteWidth = len(signatures)
+
+	transitions = [sink] * (len(rows) * byteWidth)
+	for state, row in enumerate(rows):
+		for byte, target in row.items():
+			transitions[state * byteWidth + columns[byte]] = target
+
+	# intermediate states of different states often behave the same
+	return minimizeDFA(CompiledDFA(columns, byteWidth, transitions, accepts, sink, table.tokens))
 
-			transitionTable[char].append(newState)
-			if addToEps:
-				transitionTable["states"].append(newState)
-		
+# DFA whose states are built from their NFA groups only when they are first
+# reached, with the same attributes as a CompiledDFA. Transitions which are not
+# built yet are -1 in the table, fill builds them.
+#
+# At most cacheSize states are kept. When the cache is full it is flushed, only
+# the initial state (0) and the sink (1) being kept, and states are built again
+# as they are reached.
+class LazyDFA:
+	def __init__(self, NFAGraph: CompactNFA | list[NFANode], tokens: list[str] = None, cacheSize: int = 4096):
+		nfa = NFAGraph if isinstance(NFAGraph, CompactNFA) else CompactNFA.fromGraph(NFAGraph)
+		self.tokens = [None] if tokens is None else tokens
+		self.accepting = getAccepting(nfa, self.tokens)
+		self.cacheSize = max(cacheSize, 3)
+		closures: dict[int, frozenset[int]] = {}
+		self.columns = getCharClasses(nfa, closures)
+		self.width = len(set(self.columns.values()))
+		self.nodeMoves = getNodeMoves(nfa, self.columns, closures)
+		self.initialGroup = getEpsClosure(nfa, 0, closures)
+		self.sink = 1
+		self.flushes = 0 # number of times the cache was flushed
 
-	return transitionTable
+		self.groups: list[frozenset[int]] = []
+		self.groupStates: dict[frozenset[int], int] = {}
+		self.transitions: list[int] = []
+		self.accepts: list[int] = []
+		self.flush()
+
+	@property
+	def size(self) -> int:
+		return len(self.accepts)
+
+	# drop every state except the initial one and the sink (the lists are
+	# cleared in place, so references to them stay valid)
+	def flush(self):
+		self.groups.clear()
+		self.groupStates.clear()
+		self.transitions.clear()
+		self.accepts.clear()
+		self.addState(self.initialGroup)
+		self.addState(frozenset())
+		self.transitions[self.width:] = [self.sink] * self.width
+
+	def addState(self, group: frozenset[int]) -> int:
+		state = len(self.groups)
+		self.groups.append(group)
+		self.groupStates[group] = state
+		self.transitions += [-1] * self.width
+		self.accepts.append(getAccept(group, self.accepting))
+		return state
+
+	# build the transition of state on column, returning the target state
+	def fill(self, state: int, column: int) -> int:
+		group = getGroupMove(self.groups[state], column, self.nodeMoves)
+		target = self.groupStates.get(group)
+		if target is None:
+			if len(self.groups) >= self.cacheSize:
+				# state is lost by the flush, so the transition is not cached
+				self.flush()
+				self.flushes += 1
+				return self.addState(group)
+			target = self.addState(group)
+		self.transitions[state * self.width + column] = target
+		return target
+
+# Hopcroft's minimization of a compiled DFA. The initial partition groups the
+# states by the token they accept (the priority between tokens is already
+# resolved in accepts), so states accepting different tokens are never merged.
+def minimizeDFA(table: CompiledDFA) -> CompiledDFA:
+	width = table.width
+	transitions = table.transitions
+
+	# inverse transitions: inverse[column][state] = states going to state
+	inverse = [[[] for _ in range(table.size)] for _ in range(width)]
+	for state in range(table.size):
+		for column in range(width):
+			inverse[column][transitions[state * width + column]].append(state)
+
+	# initial partition, by accepted token
+	blockIds: dict[int, int] = {}
+	blocks: list[set[int]] = []
+	blockOf: list[int] = []
+	for state, accept in enumerate(table.accepts):
+		if accept not in blockIds:
+			blockIds[accept] = len(blocks)
+			blocks.append(set())
+		blocks[blockIds[accept]].add(state)
+		blockOf.append(blockIds[accept])
+
+	work = set(range(len(blocks)))
+	while len(work) > 0:
+		splitter = list(blocks[work.pop()])
+		for column in range(width):
+			# states going into the splitter on this column, grouped by block
+			touched: dict[int, set[int]] = {}
+			for target in splitter:
+				for state in inverse[column][target]:
+					touched.setdefault(blockOf[state], set()).add(state)
+
+			for block, inside in touched.items():
+				if len(inside) == len(blocks[block]):
+					continue
+				# split the block, the states going into the splitter get a new id
+				blocks[block] -= inside
+				newBlock = len(blocks)
+				blocks.append(inside)
+				for state in inside:
+					blockOf[state] = newBlock
+				if block in work or len(inside) <= len(blocks[block]):
+					work.add(newBlock)
+				else:
+					work.add(block)
+
+	# renumber the blocks so the block of the initial state comes first
+	order = [blockOf[0]] + [block for block in range(len(blocks)) if block != blockOf[0]]
+	newIndex = [0] * len(blocks)
+	for i, block in enumerate(order):
+		newIndex[block] = i
+
+	newTransitions = [0] * (len(blocks) * width)
+	accepts = []
+	sink = -1
+	for i, block in enumerate(order):
+		state = next(iter(blocks[block]))
+		for column in range(width):
+			newTransitions[i * width + column] = newIndex[blockOf[transitions[state * width + column]]]
+		accepts.append(table.accepts[state])
+		# all states from which no token can be reached end up in one block,
+		# which loops on itself
+		if accepts[i] < 0 and all(target == i for target in newTransitions[i * width:(i + 1) * width]):
+			sink = i
+
+	return CompiledDFA(table.columns, width, newTransitions, accepts, sink, table.tokens)
+
+# Write and read length prefixed strings and arrays of 32 bit ints, the ints
+# being stored in little endian order.
+def writeString(file, string: str):
+	data = string.encode("utf-8", "surrogatepass")
+	file.write(struct.pack("<I", len(data)))
+	file.write(data)
+
+def readString(file) -> str:
+	(length,) = struct.unpack("<I", readExactly(file, 4))
+	return readExactly(file, length).decode("utf-8", "surrogatepass")
+
+def writeInts(file, ints: list[int]):
+	values = array.array("i", ints)
+	if sys.byteorder == "big":
+		values.byteswap()
+	file.write(struct.pack("<I", len(values)))
+	file.write(values.tobytes())
+
+def readInts(file) -> list[int]:
+	(length,) = struct.unpack("<I", readExactly(file, 4))
+	values = array.array("i")
+	values.frombytes(readExactly(file, length * values.itemsize))
+	if sys.byteorder == "big":
+		values.byteswap()
+	return values.tolist()
+
+def readExactly(file, size: int) -> bytes:
+	data = file.read(size)
+	if len(data) != size:
+		raise ValueError("truncated DFA table")
+	return data
+
+# Write a compiled table to a binary file: the sink and width, the characters
+# of the alphabet with their columns, the transitions, the accepted tokens and
+# the names of the tokens.
+def writeDFA(table: CompiledDFA, file):
+	file.write(struct.pack("<ii", table.sink, table.width))
+	writeString(file, "".join(table.columns))
+	writeInts(file, list(table.columns.values()))
+	writeInts(file, table.transitions)
+	writeInts(file, table.accepts)
+	file.write(struct.pack("<I", len(table.tokens)))
+	for token in table.tokens:
+		writeString(file, "" if token is None else token)
+
+# Read a table written by writeDFA.
+def readDFA(file) -> CompiledDFA:
+	(sink, width) = struct.unpack("<ii", readExactly(file, 8))
+	columns = dict(zip(readString(file), readInts(file)))
+	transitions = readInts(file)
+	accepts = readInts(file)
+	(count,) = struct.unpack("<I", readExactly(file, 4))
+	tokens = [readString(file) for _ in range(count)]
+	if tokens == [""]:
+		tokens = None
+	return CompiledDFA(columns, width, transitions, accepts, sink, tokens)
 
 class DFA(Generic[S]):
-	def __init__(self, table):
-		DFAState.newid = itertools.count()
+	def __init__(self, table: CompiledDFA, states: 'list[S]' = None):
 		self.table = table
+		# ids of the states, in the order of the compiled table
+		if states is None:
+			states = list(range(table.size))
+		self.states = states
+		self.index = {state: i for i, state in enumerate(states)}
 
 	def map(self, f: Callable[[S], T]) -> 'DFA[T]':
-		table2 = copy.deepcopy(self.table)
-		for state in table2["states"]:
-			state.id = f(state.id)
-		return DFA(table2)
+		# the compiled table is shared, only the ids are mapped
+		return DFA(self.table, [f(state) for state in self.states])
 
 	def next(self, from_state: S, on_chr: str) -> S:
-		i = 0
-		while i < len(self.table["states"]):
-			state = self.table["states"][i]
-			if state.id == from_state:
-				return self.table[on_chr][i].id
-			i += 1
-
-		return None
+		i = self.index.get(from_state)
+		column = self.table.columns.get(on_chr)
+		if i is None or column is None:
+			return None
+		return self.states[self.table.transitions[i * self.table.width + column]]
 
 	def getStates(self) -> 'set[S]':
-		res = set()
-		for state in self.table["states"]:
-			res.add(state.id)
-		return res
+		return set(self.states)
 
 	def accepts(self, str: str) -> bool:
+		columns = self.table.columns
+		transitions = self.table.transitions
+		width = self.table.width
 		# start with initial state (which is always first in table)
-		currentIndex = 0
-		currentState = self.table["states"][currentIndex]
+		state = 0
 		# iterate through all characters of the input
 		for chr in str:
+			column = columns.get(chr)
 			# if character not in DFA then reject
-			if chr not in self.table:
-				return False
-			currentState = self.table[chr][currentIndex]
-			try:
-				currentIndex = self.table["states"].index(currentState)
-			except ValueError:
+			if column is None:
 				return False
+			state = transitions[state * width + column]
 		# if input is over and current state is final then accept
-		if currentState.isFinal:
-			return True
-		return False
+		return self.table.accepts[state] >= 0
+
+	"""
+		Checks many strings at once, all of them being run through the table
+		one character position at a time with NumPy. Returns a boolean array,
+		which is True for the accepted strings.
+	"""
+	def accepts_many(self, strings: 'list[str]'):
+		# imported here rather than with the module, numpy being optional and
+		# slow to import
+		try:
+			import numpy
+		except ImportError:
+			raise ImportError("DFA.accepts_many requires numpy") from None
+		table = self.table
+		width = table.width
+		size = table.size
+		# column width is for the characters which are not in the alphabet,
+		# leading to the rejecting state size. States are kept as the offsets
+		# of their rows in the flat table.
+		transitions = numpy.empty((size + 1, width + 1), dtype=numpy.int64)
+		transitions[:size, :width] = numpy.asarray(table.transitions, dtype=numpy.int64).reshape(size, width)
+		transitions[:, width] = size
+		transitions[size, :width] = size
+		transitions = (transitions * (width + 1)).ravel()
+		accepts = numpy.append(numpy.asarray(table.accepts) >= 0, False)
+
+		# columns of the code points up to the last one of the alphabet, the
+		# ones after it being mapped to the column of unknown characters
+		limit = max((ord(char) for char in table.columns), default=-1) + 1
+		lookup = numpy.full(limit + 1, width, dtype=numpy.int64)
+		for (char, column) in table.columns.items():
+			lookup[ord(char)] = column
+
+		# columns of all the characters, the strings being joined, and offsets
+		# of the strings sorted from the longest one, so that the ones still
+		# being run at each position come first
+		strings = list(strings)
+		lengths = numpy.fromiter(map(len, strings), dtype=numpy.int64, count=len(strings))
+		codes = numpy.frombuffer("".join(strings).encode("utf-32-le", "surrogatepass"), dtype=numpy.uint32)
+		columns = lookup.take(numpy.minimum(codes, limit))
+		order = numpy.argsort(-lengths, kind="stable")
+		offsets = (numpy.cumsum(lengths) - lengths)[order]
+		longest = int(lengths[order[0]]) if len(strings) > 0 else 0
+		running = numpy.searchsorted(-lengths[order], -numpy.arange(longest), side="left")
+
+		states = numpy.zeros(len(strings), dtype=numpy.int64)
+		for position in range(longest):
+			count = running[position]
+			states[:count] = transitions.take(states[:count] + columns.take(offsets[:count] + position))
+		result = numpy.empty(len(strings), dtype=bool)
+		result[order] = accepts[states // (width + 1)]
+		return result
 
 	def isFinal(self, state: S) -> bool:
-		for state in self.table["states"]:
-			if state.id == state:
-				if state.isFinal:
-					return True
-				return False
-				
-		return False
+		i = self.index.get(state)
+		return i is not None and self.table.accepts[i] >= 0
 
 	@staticmethod
 	def fromPrenex(str: str) -> 'DFA[int]':
@@ -154,6 +600,4 @@ class DFA(Generic[S]):
 		# NEW for stage 3 -- using NFA's fromPrenex to build the DFA
 		GenericNFA = NFA.fromPrenex(str)
 		NFAGraph = GenericNFA.graph
-		table = toDFA(NFAGraph)
-		return DFA(table)
-
+		return DFA(toDFA(NFAGraph))
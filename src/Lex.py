@@ -1,76 +1,397 @@
-from typing import Tuple, List, Dict
-from src.NFA import NFA, NFANode
+import os
+import mmap
+import json
+import bisect
+import struct
+import hashlib
+import tempfile
+import functools
+import itertools
+import multiprocessing
+from typing import Tuple, List, Dict, Iterator
+from src.NFA import NFA, CompactNFA
 from src.Parser import Parser
-from src.DFA import toDFA
-
-# Get longest substring from temporary result, first token to appear in
-# configuration has bigger priority.
-def getLongestSubstring(configurations: Dict[str, str], substrings: Dict[str, str]) -> tuple[str, str]:
-	res: tuple[str, str] = None
-	# iterate through configuration
-	for (token, _) in configurations.items():
-		substring = substrings.get(token)
-		if substring is not None: # if temporary result has substring at token
-			# if function result is empty, save the found substring
-			if res is None: 
-				res = (token, substring)
-			else:
-				# save the longer substring
-				if len(substring) > len(res[1]):
-					res = (token, substring)
-	return res
-
-# get line and column of a char in word for proper error reporting
-def getLineColumn(word: str, chrIndex: int) -> tuple[int, int]:
-	column = 0
-	line = 0
-	for i in range(len(word)):
-		if word[i] == "\n":
-			line += 1
-			column = 0
-		if i == chrIndex:
-			break
-		column += 1
-	return (line, column)
-
-# performs required operations if current DFA state is final
-def processFinalState(currentState, tmpRes, word, wordStart, i):
-	if not currentState.isFinal:
-		return False
-	for NFAState in currentState.NFAGroup:
-		if NFAState.isFinal:
-			substring = tmpRes.get(NFAState.token)
-			newSubstring = word[wordStart:i] # substring from last sink state
-			if substring is None:
-				tmpRes[NFAState.token] = newSubstring # write new temp result
-			else:
-				# save longest substring
-				if len(newSubstring) > len(substring):
-					tmpRes[NFAState.token] = newSubstring
-	return True
+from src.Codegen import generateSource
+from src.DFA import toDFA, toByteDFA, minimizeDFA, productDFA, LazyDFA, writeDFA, readDFA, writeString, readString, readExactly
+
+# Error reported by the lexer when no token matches the input. position is the
+# index of the character at which lexing failed (None at the end of the input),
+# line and column are the ones written in the message.
+class LexerError(Exception):
+	def __init__(self, position: int | None, line: int, column: int | None):
+		self.position = position
+		self.line = line
+		self.column = column
+		if position is None:
+			super().__init__(f'No viable alternative at character EOF, line {line}')
+		else:
+			super().__init__(f'No viable alternative at character {column}, line {line}')
+
+	@property
+	def message(self) -> str:
+		return self.args[0]
+
+# Maximal munch over a text which may be given in several chunks. Tokens are
+# reported as (token index, start, end), offsets being counted from the start
+# of the whole text. Only the chunks from the one of the first token which is
+# not resolved yet are kept. They are not joined, a token spanning many chunks
+# being scanned from one to the next, so that each chunk is copied at most to
+# build the lexemes.
+#
+# The text fed may also start at an offset of the whole text, in which case
+# lines are counted as if a line started there.
+class Scanner:
+	def __init__(self, table, offset: int = 0):
+		self.table = table
+		# chunks kept, the offset of each one in the whole text and the end of
+		# the text fed so far
+		self.chunks: list[str] = []
+		self.starts: list[int] = []
+		self.offset = offset # offset of the first chunk in the whole text
+		self.end = offset
+		# newlines before the chunks and offset of the last one, then the same
+		# before a cursor which is moved forward as positions are asked for, so
+		# that lines are only counted as far as they are needed
+		self.newlines = 0
+		self.lastNewline = offset - 1
+		self.cursor = offset
+		self.cursorNewlines = 0
+		self.cursorLastNewline = offset - 1
+		# current token: where it starts, the scanning position and DFA state,
+		# the end and token of the longest lexeme found so far
+		self.tokenStart = offset
+		self.position = offset
+		self.state = 0
+		self.lexemeEnd = -1
+		self.lexemeToken = -1
+		self.trail: list[tuple[int, int]] = []
+		self.flushes = table.flushes
+		# (state, position) pairs from which no token can be reached, so that
+		# lexing is linear even when lexemes are found after long lookaheads.
+		# Each pair is mapped to the reach of the scan which went through it.
+		self.failed: dict[tuple[int, int], int] = {}
+		# end of the text looked at to find the last token (the end of the
+		# text + 1 if the lexer had to know the text ended there)
+		self.reach = 0
+
+	# append a chunk of text, dropping the chunks of resolved tokens
+	def feed(self, text: str):
+		# first chunk still needed
+		kept = bisect.bisect_right(self.starts, self.tokenStart) - 1
+		if kept > 0:
+			self.moveCursor(self.starts[kept])
+			self.newlines = self.cursorNewlines
+			self.lastNewline = self.cursorLastNewline
+			# new lists, as a paused generator may still read the old ones
+			self.chunks = self.chunks[kept:]
+			self.starts = self.starts[kept:]
+			self.offset = self.starts[0]
+			self.failed = {pair: reach for (pair, reach) in self.failed.items() if pair[1] >= self.offset}
+		if len(text) > 0:
+			self.chunks.append(text)
+			self.starts.append(self.end)
+			self.end += len(text)
+
+	# start lexing a new token at position, which must be in the chunks kept
+	def seek(self, position: int):
+		self.tokenStart = self.position = position
+		self.state = 0
+		self.lexemeEnd = self.lexemeToken = -1
+		self.trail = []
+
+	# get the text between two offsets, which must still be in the chunks kept
+	def text(self, start: int, end: int) -> str:
+		if len(self.chunks) == 0:
+			return ""
+		first = max(bisect.bisect_right(self.starts, start) - 1, 0)
+		chunk = self.chunks[first]
+		chunkStart = self.starts[first]
+		if end <= chunkStart + len(chunk):
+			return chunk[start - chunkStart:end - chunkStart]
+		last = bisect.bisect_left(self.starts, end) - 1
+		parts = [chunk[start - chunkStart:]] + self.chunks[first + 1:last]
+		parts.append(self.chunks[last][:end - self.starts[last]])
+		return chunk[:0].join(parts)
+
+	# Count the newlines up to position, which must be in the chunks kept.
+	# They are read by blocks, a mapped file having no count of its own.
+	def moveCursor(self, position: int):
+		if position < self.cursor or self.cursor < self.offset:
+			self.cursor = self.offset
+			self.cursorNewlines = self.newlines
+			self.cursorLastNewline = self.lastNewline
+		start = self.cursor
+		while start < position:
+			block = self.text(start, min(start + (1 << 20), position))
+			newline = "\n" if isinstance(block, str) else b"\n"
+			count = block.count(newline)
+			if count > 0:
+				self.cursorNewlines += count
+				self.cursorLastNewline = start + block.rfind(newline)
+			start += len(block)
+		self.cursor = position
+
+	# get line and column of a char in the text for proper error reporting
+	# (a newline is counted on the line it starts)
+	def getLineColumn(self, position: int) -> tuple[int, int]:
+		self.moveCursor(max(position + 1, self.offset))
+		line = self.cursorNewlines
+		lastNewline = self.cursorLastNewline
+		if lastNewline < 0:
+			return (line, position)
+		return (line, position - lastNewline)
+
+	# get line and column of a char in the text, both counted from 0
+	def locate(self, position: int) -> tuple[int, int]:
+		self.moveCursor(position)
+		return (self.cursorNewlines, position - self.cursorLastNewline - 1)
+
+	# Generate the tokens resolved so far as (token index, start, end, line,
+	# column), line and column being the ones of the start of the token.
+	def locatedTokens(self, final: bool = False):
+		for (token, start, end) in self.tokens(final):
+			yield (token, start, end) + self.locate(start)
+
+	# Generate the tokens resolved by the text fed so far. Unless final is set,
+	# the scanning stops at the end of the text and is resumed by the next
+	# call, as the rest of the text may change the current token.
+	def tokens(self, final: bool = False):
+		columns = self.table.columns
+		transitions = self.table.transitions
+		width = self.table.width
+		accepts = self.table.accepts
+		sink = self.table.sink
+
+		chunks = self.chunks
+		starts = self.starts
+		end = self.end
+		tokenStart = self.tokenStart
+		i = self.position
+		state = self.state
+		lexemeEnd = self.lexemeEnd
+		lexemeToken = self.lexemeToken
+		# the saved state was dropped from the cache of a lazy DFA, so the
+		# current token is scanned again
+		if self.flushes != self.table.flushes:
+			i = tokenStart
+			state = 0
+			lexemeEnd = lexemeToken = -1
+			self.failed.clear()
+		failed = self.failed
+		# pairs visited since the longest lexeme of the current token
+		trail = self.trail if i > tokenStart else []
+		flushes = self.table.flushes
+		# nothing left to lex (an empty text still has to be matched once)
+		if final and tokenStart >= end and end > 0:
+			return
+		# chunk being scanned, from which the position is never before offset
+		# nor after chunkEnd
+		current = max(bisect.bisect_right(starts, i) - 1, 0)
+		buffer = chunks[current] if current < len(chunks) else ""
+		offset = starts[current] if current < len(starts) else self.offset
+		chunkEnd = offset + len(buffer)
+
+		while True:
+			while True:
+				accept = accepts[state]
+				if i >= chunkEnd and chunkEnd < end: # to the next chunk
+					current += 1
+					buffer = chunks[current]
+					offset = chunkEnd
+					chunkEnd += len(buffer)
+				elif i >= end: # check if end of text reached
+					if not final:
+						self.tokenStart = tokenStart
+						self.position = i
+						self.state = state
+						self.lexemeEnd = lexemeEnd
+						self.lexemeToken = lexemeToken
+						self.flushes = self.table.flushes
+						self.trail = trail
+						return
+					if accept >= 0 and (i > tokenStart or end == 0):
+						lexemeEnd = i
+						lexemeToken = accept
+					if lexemeToken < 0:
+						line, _ = self.getLineColumn(end - 1)
+						raise LexerError(None, line, None)
+					reach = end + 1
+					break
+
+				# this pair was already scanned without finding a token, the
+				# longest lexeme is already known (errors are still found by
+				# scanning, to report them at the same place)
+				if lexemeToken >= 0 and (state, i) in failed:
+					reach = failed[(state, i)]
+					break
+
+				column = columns.get(buffer[i - offset])
+				# if character not in DFA then report error
+				if column is None:
+					line, column = self.getLineColumn(i)
+					raise LexerError(i, line, column)
+
+				# empty lexemes are never reported, they would not advance the lexer
+				if accept >= 0 and i > tokenStart:
+					lexemeEnd = i
+					lexemeToken = accept
+					trail.clear()
+				elif accept < 0:
+					trail.append((state, i))
+
+				# if current state is sink, the longest lexeme is already known
+				if state == sink:
+					if lexemeToken < 0:
+						line, column = self.getLineColumn(i)
+						raise LexerError(i - 1, line, column - 1)
+					reach = i + 1
+					break
+
+				# to next character, state (built now if the DFA is lazy)
+				nextState = transitions[state * width + column]
+				if nextState < 0:
+					nextState = self.table.fill(state, column)
+					if flushes != self.table.flushes:
+						# the pairs refer to states dropped by the lazy DFA
+						flushes = self.table.flushes
+						failed.clear()
+						trail.clear()
+				state = nextState
+				i += 1
+
+			# nothing was found after the longest lexeme
+			failed.update(dict.fromkeys(trail, reach))
+			trail.clear()
+			self.reach = reach
+			yield (lexemeToken, tokenStart, lexemeEnd)
+			if flushes != self.table.flushes:
+				# another scanner flushed the lazy DFA while this one was
+				# paused, the pairs refer to states which were renumbered
+				flushes = self.table.flushes
+				failed.clear()
+			# reset DFA to its initial state for the next token
+			tokenStart = i = lexemeEnd
+			state = 0
+			lexemeEnd = lexemeToken = -1
+			if i < offset:
+				current = bisect.bisect_right(starts, i) - 1
+				buffer = chunks[current]
+				offset = starts[current]
+				chunkEnd = offset + len(buffer)
+			if tokenStart >= end and final:
+				self.tokenStart = self.position = tokenStart
+				return
+
+# Table used by the worker processes of Lexer.lex_parallel, sent once to each
+# worker when the pool starts.
+workerTable = None
+
+def initWorker(table):
+	global workerTable
+	workerTable = table
+
+"""
+	Lexes a chunk of a text in a worker, as if the lexer had to start a token
+	at its beginning. The tokens are the ones which can be resolved from the
+	chunk alone (all of them for the last chunk), their offsets and lines
+	being shifted to the ones of the whole text. Returns the tokens, the end of
+	the last one and whether lexing failed there.
+"""
+def lexChunk(task: tuple) -> tuple[list[tuple[int, ...]], int, bool]:
+	(chunk, offset, line, column, final, positions) = task
+	scanner = Scanner(workerTable)
+	scanner.feed(chunk)
+	tokens = []
+	try:
+		if positions:
+			for (token, start, end, tokenLine, tokenColumn) in scanner.locatedTokens(final):
+				if tokenLine == 0:
+					tokenColumn += column
+				tokens.append((token, start + offset, end + offset, tokenLine + line, tokenColumn))
+		else:
+			for (token, start, end) in scanner.tokens(final):
+				tokens.append((token, start + offset, end + offset))
+	except LexerError:
+		return (tokens, offset + scanner.tokenStart, True)
+	return (tokens, offset + scanner.tokenStart, False)
+
+# Build the minimal DFA of a single token, in a worker of Lexer
+def compileToken(regex: str, construction: str = "thompson"):
+	return minimizeDFA(toDFA(NFA.fromPrenex(Parser.toPrenex(regex), construction).graph))
+
+# Lex documents in a worker, the result of each one being the one of Lexer.lex
+def lexBatch(batch: list[str]) -> list[List[Tuple[str, str]] | str]:
+	tokens = workerTable.tokens
+	results = []
+	for word in batch:
+		scanner = Scanner(workerTable)
+		scanner.feed(word)
+		try:
+			results.append([(tokens[token], word[start:end]) for (token, start, end) in scanner.tokens(final=True)])
+		except LexerError as error:
+			results.append(error.message)
+	return results
 
 class Lexer:
+	# header of the files written by save, the version being changed whenever
+	# the format or the construction of the tables changes
+	MAGIC = b"LEXR"
+	VERSION = 1
 
 	"""
 		This constructor initializes the lexer with a configuration
 		The configuration is passed as a dictionary TOKEN -> REGEX
 
 		You are encouraged to use the functions from the past stages to parse the regexes
+
+		With lazy set, DFA states are only built when the lexer first reaches
+		them, at most cacheSize of them being kept at once
+
+		With workers set, the DFA of each token is built on its own, in a pool
+		of that many processes, the DFAs being then combined into the one of
+		the lexer (lazy lexers, which build their states as they go, do not
+		support workers)
+
+		construction is the one of the NFAs of the tokens, as in NFA.fromPrenex
 	"""
-	def __init__(self, configurations: Dict[str, str]) -> None:
-		initialNFANode = NFANode() # initial NFA node for an single NFA
-		finalNFAGraph: list[NFANode] = []
-		finalNFAGraph.append(initialNFANode)
-		for (token, regex) in configurations.items():
-			tmpNFA = NFA.fromPrenex(Parser.toPrenex(regex))
-			tmpNFA.graph[-1].token = token # save token for last nodes
-			# Create transition between the initial node to initial nodes of
-			# other NFAs.
-			initialNFANode.transitions.append((tmpNFA.graph[0], "eps"))
-			finalNFAGraph += tmpNFA.graph # add nodes to a single graph
-		self.DFATable = toDFA(finalNFAGraph) # convert the result NFA to DFA
+	def __init__(self, configurations: Dict[str, str], lazy: bool = False, cacheSize: int = 4096,
+				workers: int = None, construction: str = "thompson") -> None:
+		if workers is not None and lazy:
+			raise ValueError("workers are not supported by lazy lexers")
+		if workers is not None:
+			# minimal DFAs of the tokens, combined in the order of the
+			# configuration
+			regexes = list(configurations.values())
+			build = functools.partial(compileToken, construction=construction)
+			if workers == 1:
+				tables = list(map(build, regexes))
+			else:
+				with multiprocessing.Pool(workers) as pool:
+					tables = pool.map(build, regexes)
+			table = productDFA(tables, list(configurations))
+		else:
+			# compact NFAs of the tokens, combined under a single initial node
+			# (the node graphs of each token are dropped once converted)
+			nfas = [CompactNFA.fromGraph(NFA.fromPrenex(Parser.toPrenex(regex), construction).graph)
+				for regex in configurations.values()]
+			finalNFA = CompactNFA.union(nfas, list(configurations))
+			# convert the result NFA to a dense DFA table, tokens being prioritized
+			# in the order of the configuration
+			if lazy:
+				table = LazyDFA(finalNFA, list(configurations), cacheSize)
+			else:
+				table = toDFA(finalNFA, list(configurations))
+		if lazy:
+			self.table = table
+			self.stateCounts = None
+		else:
+			self.table = minimizeDFA(table)
+			# number of DFA states before and after minimization
+			self.stateCounts = (table.size, self.table.size)
 		# save configurations for future use
 		self.configurations = configurations
+		# DFA over UTF-8 bytes, built by the first call to lex_file
+		self.byteTable = None
 
 	"""
 		The main functionality of the lexer, receives a word and lexes it
@@ -80,74 +401,480 @@ class Lexer:
 		or a string message if the lexer fails
 	"""
 	def lex(self, word: str) -> List[Tuple[str, str]] | str:
-		# used for DFA traversing
-		currentIndex = 0
-		currentState = self.DFATable["states"][currentIndex]
-
-		# temporary and final results
-		tmpRes: Dict[str, str] = {}
-		res: list[tuple[str, str]] = []
-		
-		# index of character in word in the moment of last sink state visit
-		wordStart = 0
-		i = 0 # main character index
-		while True:
-			if i >= len(word): # check if end of word reached
-				if processFinalState(currentState, tmpRes, word, wordStart, i):
-					# finish lexer execution when final state reached on word end
-					break 
-				else:
-					toAppend = getLongestSubstring(self.configurations, tmpRes)
-					if toAppend is None:
-						line, _ = getLineColumn(word, len(word) - 1)
-						return f'No viable alternative at character EOF, line {line}'
-					res.append(toAppend) # write one more result, if any
-					wordStart += len(toAppend[1])
-					i = wordStart # put index back to seek for new substring
-					tmpRes = {}
-					# reset DFA
-					currentIndex = 0
-					currentState = self.DFATable["states"][currentIndex]
-					if i >= len(word):
-						break
-
-			chr = word[i]
-			# if character not in DFA then report error
-			if chr not in self.DFATable:
-				line, column = getLineColumn(word, i)
-				return f'No viable alternative at character {column}, line {line}'
-
-			processFinalState(currentState, tmpRes, word, wordStart, i)
-			
-			# if current state is sink
-			if len(currentState.NFAGroup) == 0:
-				toAppend = getLongestSubstring(self.configurations, tmpRes)
-				if toAppend is None:
-					line, column = getLineColumn(word, i)
-					return f'No viable alternative at character {column - 1}, line {line}'
-				res.append(toAppend)
-				wordStart += len(toAppend[1])
-				i = wordStart
-				tmpRes = {}
-				currentIndex = 0
-				currentState = self.DFATable["states"][currentIndex]
-				continue
+		try:
+			return list(self.iter_tokens(word))
+		except LexerError as error:
+			return error.message
+
+	"""
+		Generates the tuples (TOKEN, LEXEM) of a word one by one, the rest of
+		the word being lexed only when more tokens are requested.
+
+		With positions set, the tuples are (TOKEN, LEXEM, line, column), as
+		in lex_offsets.
+
+		LexerError is raised when the lexer fails
+	"""
+	def iter_tokens(self, word: str, positions: bool = False) -> Iterator[Tuple]:
+		tokens = self.table.tokens
+		scanner = Scanner(self.table)
+		scanner.feed(word)
+		if positions:
+			for (token, start, end, line, column) in scanner.locatedTokens(final=True):
+				yield (tokens[token], word[start:end], line, column)
+			return
+		for (token, start, end) in scanner.tokens(final=True):
+			yield (tokens[token], word[start:end])
+
+	"""
+		Lexes a word without building any lexeme: the result is a list of
+		(token index, start, end) tuples, the names of the tokens being in
+		Lexer.tokens and the lexemes being word[start:end].
+
+		With positions set, the line and column of the start of each token
+		(both counted from 0) are added to its tuple.
+
+		LexerError is raised when the lexer fails
+	"""
+	def lex_offsets(self, word: str, positions: bool = False) -> List[Tuple[int, ...]]:
+		scanner = Scanner(self.table)
+		scanner.feed(word)
+		if positions:
+			return list(scanner.locatedTokens(final=True))
+		return list(scanner.tokens(final=True))
+
+	"""
+		Lexes a file without decoding or copying it: the file is mapped in
+		memory and its UTF-8 bytes are run through a byte level DFA. The result
+		is a list of (token index, start, end) tuples, offsets being counted in
+		bytes, and errors report byte positions too.
+
+		With positions set, the line and column of the start of each token are
+		added to its tuple, as in lex_offsets (columns are counted in bytes).
 
-			# to next character, state
-			currentState = self.DFATable[chr][currentIndex]
+		LexerError is raised when the lexer fails
+	"""
+	def lex_file(self, path: str, positions: bool = False) -> List[Tuple[int, ...]]:
+		if isinstance(self.table, LazyDFA):
+			raise ValueError("lex_file is not supported by lazy lexers")
+		if self.byteTable is None:
+			self.byteTable = toByteDFA(self.table)
+
+		with open(path, "rb") as f:
 			try:
-				currentIndex = self.DFATable["states"].index(currentState)
+				mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 			except ValueError:
-				line, column = getLineColumn(word, i)
-				return f'No viable alternative at character {column}, line {line}'
-			i += 1
+				# empty files cannot be mapped
+				mapping = b""
+			try:
+				scanner = Scanner(self.byteTable)
+				scanner.feed(mapping)
+				if positions:
+					return list(scanner.locatedTokens(final=True))
+				return list(scanner.tokens(final=True))
+			finally:
+				if isinstance(mapping, mmap.mmap):
+					mapping.close()
+
+	# names of the tokens, in the order of the configuration
+	@property
+	def tokens(self) -> List[str]:
+		return self.table.tokens
+
+	# build a lexer, which can then be saved, or get it from a compile cache
+	@classmethod
+	def compile(cls, configurations: Dict[str, str], cache: "LexerCache" = None) -> "Lexer":
+		if cache is not None:
+			return cache.get(configurations)
+		return cls(configurations)
 
-		# save last temporary results
-		toAppend = getLongestSubstring(self.configurations, tmpRes)
-		if toAppend is not None:
-			res.append(toAppend)
-		if len(res) > 0:
-			return res
-		# if no final results -- report error
-		line, _ = getLineColumn(word, len(word) - 1)
-		return f'No viable alternative at character EOF, line {line}'
\ No newline at end of file
+	"""
+		Saves the DFA table of the lexer to a binary file, which Lexer.load
+		reads back without building any automaton. The file holds a header
+		with the format version, the state counts and the regexes of the
+		configuration, followed by the table (see writeDFA).
+	"""
+	def save(self, path: str):
+		if isinstance(self.table, LazyDFA):
+			raise ValueError("lazy lexers can not be saved")
+		with open(path, "wb") as f:
+			self.write(f)
+
+	# write the lexer to a binary file object, as save does
+	def write(self, file):
+		file.write(self.MAGIC)
+		file.write(struct.pack("<HiiI", self.VERSION, *self.stateCounts, len(self.configurations)))
+		for regex in self.configurations.values():
+			writeString(file, regex)
+		writeDFA(self.table, file)
+
+	"""
+		Generates the source of a standalone Python module lexing as this lexer
+		does, with the DFA table as constants: its lex(word) and
+		lex_offsets(word) functions behave as the methods of the lexer. The
+		source is also written to path if one is given.
+	"""
+	def generate(self, path: str = None) -> str:
+		if isinstance(self.table, LazyDFA):
+			raise ValueError("lazy lexers can not be generated")
+		source = generateSource(self.table)
+		if path is not None:
+			with open(path, "w", encoding="utf-8") as f:
+				f.write(source)
+		return source
+
+	# load a lexer saved by Lexer.save
+	@classmethod
+	def load(cls, path: str) -> "Lexer":
+		with open(path, "rb") as f:
+			return cls.read(f)
+
+	# read a lexer from a binary file object, as load does
+	@classmethod
+	def read(cls, file) -> "Lexer":
+		if file.read(len(cls.MAGIC)) != cls.MAGIC:
+			raise ValueError("not a saved lexer")
+		(version, raw, minimized, count) = struct.unpack("<HiiI", readExactly(file, 14))
+		if version != cls.VERSION:
+			raise ValueError(f"unsupported lexer format version {version}")
+		regexes = [readString(file) for _ in range(count)]
+		lexer = cls.__new__(cls)
+		lexer.table = readDFA(file)
+		lexer.stateCounts = (raw, minimized)
+		lexer.configurations = dict(zip(lexer.table.tokens, regexes))
+		lexer.byteTable = None
+		return lexer
+
+	"""
+		Lexes a word in a pool of worker processes, returning the same list as
+		lex_offsets. The word is split in chunks of about chunkSize characters
+		right after a sync character, the chunks being lexed at the same time
+		as if a token started at their beginning. Tokens crossing the end of a
+		chunk are then lexed again, until the tokens meet the ones of a chunk:
+		the sync character only has to be a likely token boundary (such as a
+		newline outside of comments and strings) for this to be rare.
+
+		LexerError is raised when the lexer fails
+	"""
+	def lex_parallel(self, word: str, workers: int = None, chunkSize: int = 1 << 20,
+					sync: str = "\n", positions: bool = False) -> List[Tuple[int, ...]]:
+		if isinstance(self.table, LazyDFA):
+			raise ValueError("lex_parallel is not supported by lazy lexers")
+		# chunk starts, each one right after a sync character
+		starts = [0]
+		while True:
+			found = word.find(sync, starts[-1] + chunkSize - 1)
+			if found < 0 or found + 1 >= len(word):
+				break
+			starts.append(found + 1)
+		if len(starts) == 1 or workers == 1:
+			return self.lex_offsets(word, positions)
+
+		tasks = []
+		line = 0
+		for (k, start) in enumerate(starts):
+			if k > 0:
+				line += word.count("\n", starts[k - 1], start)
+			column = start - word.rfind("\n", 0, start) - 1
+			final = k == len(starts) - 1
+			end = len(word) if final else starts[k + 1]
+			tasks.append((word[start:end], start, line, column, final, positions))
+		with multiprocessing.Pool(workers, initWorker, (self.table,)) as pool:
+			chunks = pool.map(lexChunk, tasks)
+
+		# stitch the tokens of the chunks, the text between the last token
+		# taken and the next one of a chunk being lexed here
+		result = []
+		scanner = None
+		taken = [False] * len(chunks)
+		position = 0
+		k = 0
+		while position < len(word):
+			while k + 1 < len(starts) and starts[k + 1] <= position:
+				k += 1
+			(tokens, end, failed) = chunks[k]
+			if not taken[k]:
+				first = bisect.bisect_left(tokens, position, key=lambda token: token[1])
+				if position == starts[k] or (first < len(tokens) and tokens[first][1] == position):
+					result.extend(tokens[first:] if first > 0 else tokens)
+					taken[k] = True
+					position = end
+					continue
+			if scanner is None:
+				scanner = Scanner(self.table)
+				scanner.feed(word)
+			scanner.seek(position)
+			token = next(scanner.locatedTokens(True) if positions else scanner.tokens(True))
+			result.append(token)
+			position = token[2]
+		return result
+
+	"""
+		Lexes many documents in a pool of worker processes, generating the
+		result of Lexer.lex for each of them, in order. The table is sent to
+		each worker once, when the pool starts; the documents and the results
+		are then sent in batches of batchSize documents.
+	"""
+	def lex_many(self, docs, workers: int = None, batchSize: int = 256) -> Iterator[List[Tuple[str, str]] | str]:
+		if isinstance(self.table, LazyDFA):
+			raise ValueError("lex_many is not supported by lazy lexers")
+		if workers == 1:
+			yield from map(self.lex, docs)
+			return
+		docs = iter(docs)
+		batches = iter(lambda: list(itertools.islice(docs, batchSize)), [])
+		with multiprocessing.Pool(workers, initWorker, (self.table,)) as pool:
+			for results in pool.imap(lexBatch, batches):
+				yield from results
+
+	"""
+		Lexes a text read in chunks, from a file-like object (read is called
+		until it returns an empty string) or from an iterable of strings.
+
+		The tuples (TOKEN, LEXEM) are generated as soon as the lexemes are
+		known, only the text of the token being lexed is kept in memory.
+		With positions set, the tuples are (TOKEN, LEXEM, line, column), as
+		in lex_offsets.
+
+		LexerError is raised if the lexer fails
+	"""
+	def lex_stream(self, source, chunkSize: int = 1 << 16, positions: bool = False) -> Iterator[Tuple]:
+		if hasattr(source, "read"):
+			source = iter(functools.partial(source.read, chunkSize), "")
+		tokens = self.table.tokens
+		scanner = Scanner(self.table)
+		located = scanner.locatedTokens if positions else scanner.tokens
+		# the tokens resolved so far, with their lexemes and positions
+		def resolved(final: bool):
+			for (token, start, end, *position) in located(final):
+				yield (tokens[token], scanner.text(start, end), *position)
+		for chunk in source:
+			scanner.feed(chunk)
+			yield from resolved(False)
+		yield from resolved(True)
+
+# Directory of saved lexers, shared by the processes building the same
+# configurations. The files are named after a hash of the configuration (the
+# order of the tokens included, as it gives their priority) and of the format
+# version. Once the files take more than maxBytes, the least recently used
+# ones are removed, the time of their last use being their modification time.
+class LexerCache:
+	SUFFIX = ".lexr"
+
+	def __init__(self, directory: str, maxBytes: int = 64 << 20):
+		self.directory = directory
+		self.maxBytes = maxBytes
+		os.makedirs(directory, exist_ok=True)
+
+	def key(self, configurations: Dict[str, str]) -> str:
+		data = json.dumps([Lexer.VERSION, list(configurations.items())])
+		return hashlib.sha256(data.encode("utf-8", "surrogatepass")).hexdigest()
+
+	def path(self, configurations: Dict[str, str]) -> str:
+		return os.path.join(self.directory, self.key(configurations) + self.SUFFIX)
+
+	# get the lexer of a configuration, building and saving it if needed
+	def get(self, configurations: Dict[str, str]) -> Lexer:
+		path = self.path(configurations)
+		try:
+			lexer = Lexer.load(path)
+			os.utime(path)
+			if lexer.configurations == configurations:
+				return lexer
+		except (OSError, ValueError, struct.error):
+			# missing, evicted meanwhile or damaged
+			pass
+		lexer = Lexer(configurations)
+		self.put(path, lexer)
+		return lexer
+
+	# save a lexer to a temporary file renamed at once, so that other
+	# processes never read a partial file
+	def put(self, path: str, lexer: Lexer):
+		(descriptor, temporary) = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+		try:
+			with os.fdopen(descriptor, "wb") as f:
+				lexer.write(f)
+			os.replace(temporary, path)
+		except BaseException:
+			os.unlink(temporary)
+			raise
+		self.evict()
+
+	# remove the least recently used files until the cache fits in maxBytes
+	def evict(self):
+		entries = []
+		total = 0
+		for entry in os.scandir(self.directory):
+			if not entry.name.endswith(self.SUFFIX):
+				continue
+			try:
+				stat = entry.stat()
+			except FileNotFoundError:
+				continue
+			entries.append((stat.st_mtime, entry.path, stat.st_size))
+			total += stat.st_size
+		entries.sort()
+		for (_, path, size) in entries:
+			if total <= self.maxBytes:
+				break
+			try:
+				os.unlink(path)
+			except FileNotFoundError:
+				pass
+			total -= size
+
+# Tokens of a text which keeps being edited, as in an editor. An edit only
+# lexes again the tokens from the first one whose lexer looked past the start
+# of the edit, until a new token starts where an old one did (after the edit):
+# from there on, the old tokens are the same.
+class IncrementalLexer:
+	def __init__(self, lexer: Lexer, text: str):
+		self.lexer = lexer
+		self.text = text
+		# (token index, start, end, reach, maximum reach) of each token, reach
+		# being the end of the text looked at to find it (see Scanner.reach)
+		# and the maximum one being over the token and all the ones before it.
+		# The entries from gap on are stored with offsets delta smaller than
+		# the real ones, so that an edit only moves the entries between the gap
+		# and itself.
+		self.entries: list[tuple[int, int, int, int, int]] | None = None
+		self.gap = 0
+		self.delta = 0
+		self.edit(0, 0, "")
+
+	# names of the tokens, in the order of the configuration
+	@property
+	def names(self) -> List[str]:
+		return self.lexer.tokens
+
+	# (token index, start, end) of every token
+	@property
+	def offsets(self) -> List[Tuple[int, int, int]]:
+		return [self.entry(i)[:3] for i in range(len(self.entries))]
+
+	def entry(self, i: int) -> tuple[int, int, int, int, int]:
+		entry = self.entries[i]
+		if i < self.gap or self.delta == 0:
+			return entry
+		delta = self.delta
+		return (entry[0], entry[1] + delta, entry[2] + delta, entry[3] + delta, entry[4] + delta)
+
+	# move the gap to index, updating the entries in between
+	def moveGap(self, index: int):
+		entries = self.entries
+		delta = self.delta
+		if delta == 0:
+			self.gap = index
+			return
+		while self.gap < index:
+			(token, start, end, reach, maxReach) = entries[self.gap]
+			entries[self.gap] = (token, start + delta, end + delta, reach + delta, maxReach + delta)
+			self.gap += 1
+		while self.gap > index:
+			self.gap -= 1
+			(token, start, end, reach, maxReach) = entries[self.gap]
+			entries[self.gap] = (token, start - delta, end - delta, reach - delta, maxReach - delta)
+
+	# Generate the tokens of the text from the start of a scanner, the text
+	# being fed to it in chunks of growing size: only the text up to the
+	# tokens which are kept is looked at.
+	def scan(self, scanner: Scanner):
+		start = scanner.offset
+		size = 1 << 10
+		while True:
+			final = start + size >= len(self.text)
+			scanner.feed(self.text[start:start + size])
+			start += size
+			size *= 2
+			yield from scanner.tokens(final)
+			if final:
+				return
+
+	"""
+		Applies an edit to the text: removed characters starting at offset are
+		replaced by inserted. Returns (index, removed tokens, inserted tokens),
+		the tokens from index on being the ones which changed.
+
+		LexerError is raised if the new text can not be lexed, the next edit
+		lexing the whole text again
+	"""
+	def edit(self, offset: int, removed: int, inserted: str) -> tuple[int, int, int]:
+		self.text = self.text[:offset] + inserted + self.text[offset + removed:]
+		if self.entries is None:
+			# first lexing, or the last edit failed
+			self.entries = []
+			self.gap = self.delta = 0
+			offset = 0
+		count = len(self.entries)
+		shift = len(inserted) - removed
+
+		# first token starting at the edit or after it
+		low, high = 0, count
+		while low < high:
+			middle = (low + high) // 2
+			if self.entry(middle)[1] < offset:
+				low = middle + 1
+			else:
+				high = middle
+		# first token whose lexer looked at the edit, found by bisection as
+		# the maximum reaches only grow
+		high = low
+		low = 0
+		while low < high:
+			middle = (low + high) // 2
+			if self.entry(middle)[4] <= offset:
+				low = middle + 1
+			else:
+				high = middle
+		first = low
+		if first < count:
+			start = self.entry(first)[1]
+		else:
+			start = self.entry(first - 1)[2] if first > 0 else 0
+
+		scanner = Scanner(self.lexer.table, start)
+		newEntries = []
+		# first old token which may be kept
+		kept = first
+		editEnd = offset + len(inserted)
+		maxReach = self.entry(first - 1)[4] if first > 0 else 0
+		try:
+			for (token, tokenStart, tokenEnd) in self.scan(scanner):
+				while kept < count and self.entry(kept)[1] + shift < tokenStart:
+					kept += 1
+				if tokenStart >= editEnd and kept < count and self.entry(kept)[1] + shift == tokenStart:
+					break
+				maxReach = max(maxReach, scanner.reach)
+				newEntries.append((token, tokenStart, tokenEnd, scanner.reach, maxReach))
+			else:
+				kept = count
+		except LexerError:
+			self.entries = None
+			# the scanner only counted lines from start, the error is found
+			# again over the whole text for its line to be reported
+			scanner = Scanner(self.lexer.table)
+			scanner.feed(self.text)
+			scanner.seek(start)
+			for _ in scanner.tokens(final=True):
+				pass
+			raise
+
+		self.moveGap(kept)
+		self.entries[first:kept] = newEntries
+		self.gap = first + len(newEntries)
+		self.delta += shift
+		# the maximum reaches of the kept tokens change up to the first one
+		# reaching as far as the new or the old tokens did, so only the ones
+		# starting in the text those looked at are updated
+		entries = self.entries
+		delta = self.delta
+		i = self.gap
+		while i < len(entries):
+			(token, start, end, reach, oldMaxReach) = entries[i]
+			maxReach = max(maxReach, reach + delta)
+			if maxReach == oldMaxReach + delta:
+				break
+			entries[i] = (token, start, end, reach, maxReach - delta)
+			i += 1
+		return (first, kept - first, len(newEntries))
@@ -1,5 +1,6 @@
 from ast import List
 import copy
+import array
 import itertools
 from typing import Callable, Generic, TypeVar
 
@@ -50,34 +51,73 @@ def mySplit(string: str) -> 'List[str]':
 
 	return res
 
-# convert list of strings to AST
+# number of operands of each operator
+arity = {"UNION": 2, "CONCAT": 2, "STAR": 1, "MAYBE": 1, "PLUS": 1}
+
+# convert list of strings to AST, reading the words with a cursor and keeping
+# the operators still waiting for operands on a stack. The words after the
+# expression are returned too, starting with its last word.
 def toAST(wordList: 'list[str]') -> 'tuple[ASTNode, str]':
-    node = ASTNode(wordList[0])
-    if (node.data == "UNION") or (node.data == "CONCAT"):
-		# recursive call consuming a string
-        child1, wordList = toAST(wordList[1:])
-        child2, wordList = toAST(wordList[1:])
-		# append to results after the required recursive calls
-        node.children.append(child1)
-        node.children.append(child2)
-    elif (node.data == "STAR"):
-        child, wordList = toAST(wordList[1:])
-        node.children.append(child)
-	# convert MAYBE to UNION and eps equivalent
-    elif (node.data == "MAYBE"):
-        node.data = "UNION"
-        child1, wordList = toAST(wordList[1:])
-        node.children.append(child1)
-        node.children.append(ASTNode("eps"))
-	# convert PLUS to CONCAT and STAR equivalent
-    elif (node.data == "PLUS"):
-        node.data = "CONCAT"
-        child1, wordList = toAST(wordList[1:])
-        node.children.append(child1)
-        node.children.append(ASTNode("STAR", [child1]))
-	# if atom is reached, just return is made
-
-    return node, wordList
+    root = None
+    # operators whose operands are not all read yet
+    stack: list[ASTNode] = []
+    i = 0
+    while root is None:
+        node = ASTNode(wordList[i])
+        if node.data in arity:
+            stack.append(node)
+            i += 1
+            continue
+        # the atom, then the operators it completes
+        while True:
+            if len(stack) == 0:
+                root = node
+                break
+            parent = stack[-1]
+            parent.children.append(node)
+            if len(parent.children) < arity[parent.data]:
+                break
+            stack.pop()
+            # convert MAYBE to UNION and eps equivalent
+            if parent.data == "MAYBE":
+                parent.data = "UNION"
+                parent.children.append(ASTNode("eps"))
+            # convert PLUS to CONCAT and STAR equivalent
+            elif parent.data == "PLUS":
+                parent.data = "CONCAT"
+                parent.children.append(ASTNode("STAR", [parent.children[0]]))
+            node = parent
+        i += 1
+
+    return root, wordList[i - 1:]
+
+# Get the characters of a class atom written in prenex form, such as "[a-z]",
+# or None if the atom is not a class.
+def getClassChars(atom: str) -> frozenset[str] | None:
+	if len(atom) < 5 or atom[0] != "[" or atom[-1] != "]" or (len(atom) - 2) % 3 != 0:
+		return None
+	res = set()
+	for i in range(1, len(atom) - 1, 3):
+		if atom[i + 1] != "-":
+			return None
+		for j in range(ord(atom[i]), ord(atom[i + 2]) + 1):
+			res.add(chr(j))
+	return frozenset(res)
+
+# Get the characters matched by a transition label: a single character, a class
+# of characters or none at all for "eps" and for longer labels (ex. "void").
+def getLabelChars(label: str | frozenset[str]) -> frozenset[str]:
+	if type(label) is frozenset:
+		return label
+	if label != "eps" and len(label) == 1:
+		return frozenset(label)
+	return frozenset()
+
+# check if a transition label matches the given character
+def labelMatches(label: str | frozenset[str], char: str) -> bool:
+	if type(label) is frozenset:
+		return char in label
+	return label == char
 
 # NFA node class
 class NFANode:
@@ -85,119 +125,300 @@ class NFANode:
 	def __init__(self, token: str = None):
 		# id + 1 on each constructor call
 		self.id = next(NFANode.newid)
-		self.transitions: list[tuple[NFANode, str]] = []
+		# transitions are labelled by a character, "eps" or a class of
+		# characters (as a frozenset)
+		self.transitions: list[tuple[NFANode, str | frozenset[str]]] = []
 		self.isFinal = False
 		self.token = token
 
-# convert AST to NFA graph
+# convert AST to NFA graph, the nodes of each subtree being contiguous in it,
+# starting with its initial node and ending with its final one
 def toNFA(tree: ASTNode) -> list[NFANode]:
-	res = []
-	expression = tree.data # save operation or atom name
-	if (expression == "UNION"):
-		startNode = NFANode() # create new start node
-		res.append(startNode) # append it to result graph
-
-		# get AST tree children
-		child1 = tree.children[0]
-		child2 = tree.children[1]
-
-		# to NFA conversion on first branch of UNION
-		branch1 = toNFA(child1)
-		endNode = NFANode() # create end node of UNION
-		# Add eps transition from start node of UNION to first node of first
-		# UNION branch.
-		startNode.transitions.append((branch1[0], "eps"))
-		# eps transition from last node of branch1 to end node of UNION
-		branch1[-1].transitions.append((endNode, "eps"))
-
-		branch2 = toNFA(child2) # toNFA on second branch of UNION
-		# eps transition from UNION start to branch2 start
-		startNode.transitions.append((branch2[0], "eps"))
-		# eps from last of branch2 to last of UNION
-		branch2[-1].transitions.append((endNode, "eps"))
-
-		res += branch1 + branch2 # combine results
-		res.append(endNode) # add UNION end node to graph
-
-	elif (expression == "CONCAT"):
-		child1 = tree.children[0]
-		child2 = tree.children[1]
-
-		# to NFA both children
-		# op = operand (in this case)
-		op1 = toNFA(child1)
-		op2 = toNFA(child2)
-
-		res = op1 + op2 # combine results and save in res graph
-
-		endNode1 = op1[-1]
-		node2 = op2[0]
-
-		# connect end node of op1 and start node of op2 with an eps transition
-		endNode1.transitions.append((node2, "eps"))
-
-	elif (expression == "STAR"):
-		startNode = NFANode()
-		res.append(startNode)
-
-		child = tree.children[0]
-		# process the inner NFA of STAR
-		nfa = toNFA(child)
-		endNode = NFANode()
-
-		# add required eps transitions for STAR as per Thompson's construction
-		startNode.transitions.append((endNode, "eps"))
-		startNode.transitions.append((nfa[0], "eps"))
-		nfa[-1].transitions.append((nfa[0], "eps"))
-		nfa[-1].transitions.append((endNode, "eps"))
-
-		# append results to final graph
-		res += nfa
-		res.append(endNode)
-	
-	# if atom
-	else:
-		# create start, end nodes
-		startNode = NFANode()
-		endNode = NFANode()
-		res.append(startNode)
-
-		# set transition between
-		startNode.transitions.append((endNode, expression))
-
-		res.append(endNode)
-	
-	return res
-
-# recursvie accept helper function for NFA
-def NFAAccept(graph: list[NFANode], currentNode: NFANode, input: str) -> bool:
-	res = False
-	# if no more word and node is final
-	# NEW for stage 3 -- improved final node (state) check
-	if len(input) <= 0 and currentNode.isFinal:
-		return True
+	res: list[NFANode] = []
+	# subtrees being converted, with the number of children already converted
+	# and the nodes kept until the end of the subtree (the initial nodes of
+	# UNION and STAR, the end node of UNION, the last node of a CONCAT operand)
+	stack = [(tree, 0, None, None)]
+	# initial and final nodes of the last converted subtree
+	first = last = None
+	while len(stack) > 0:
+		(tree, done, node1, node2) = stack.pop()
+		expression = tree.data # save operation or atom name
+		if (expression == "UNION"):
+			if done == 0:
+				startNode = NFANode() # create new start node
+				res.append(startNode) # append it to result graph
+				stack.append((tree, 1, startNode, None))
+				stack.append((tree.children[0], 0, None, None))
+			elif done == 1:
+				startNode = node1
+				endNode = NFANode() # create end node of UNION
+				# Add eps transition from start node of UNION to first node of
+				# first UNION branch.
+				startNode.transitions.append((first, "eps"))
+				# eps transition from last node of branch1 to end node of UNION
+				last.transitions.append((endNode, "eps"))
+				stack.append((tree, 2, startNode, endNode))
+				stack.append((tree.children[1], 0, None, None))
+			else:
+				(startNode, endNode) = (node1, node2)
+				# eps transition from UNION start to branch2 start
+				startNode.transitions.append((first, "eps"))
+				# eps from last of branch2 to last of UNION
+				last.transitions.append((endNode, "eps"))
+				res.append(endNode) # add UNION end node to graph
+				(first, last) = (startNode, endNode)
+
+		elif (expression == "CONCAT"):
+			# op = operand (in this case)
+			if done == 0:
+				stack.append((tree, 1, None, None))
+				stack.append((tree.children[0], 0, None, None))
+			elif done == 1:
+				stack.append((tree, 2, first, last))
+				stack.append((tree.children[1], 0, None, None))
+			else:
+				# connect end node of op1 and start node of op2 with an eps
+				# transition
+				(startNode1, endNode1) = (node1, node2)
+				endNode1.transitions.append((first, "eps"))
+				first = startNode1
+
+		elif (expression == "STAR"):
+			if done == 0:
+				startNode = NFANode()
+				res.append(startNode)
+				stack.append((tree, 1, startNode, None))
+				# process the inner NFA of STAR
+				stack.append((tree.children[0], 0, None, None))
+			else:
+				startNode = node1
+				endNode = NFANode()
+				# add required eps transitions for STAR as per Thompson's
+				# construction
+				startNode.transitions.append((endNode, "eps"))
+				startNode.transitions.append((first, "eps"))
+				last.transitions.append((first, "eps"))
+				last.transitions.append((endNode, "eps"))
+				res.append(endNode)
+				(first, last) = (startNode, endNode)
+
+		# if atom
+		else:
+			# create start, end nodes
+			startNode = NFANode()
+			endNode = NFANode()
+			res.append(startNode)
 
-	for transition in currentNode.transitions:
-		if (len(input) > 0) and (transition[1] == input[0]):
-			res = NFAAccept(graph, transition[0], input[1:])
-		elif transition[1] == "eps":
-			# do not consume word if eps transition
-			res = NFAAccept(graph, transition[0], input)
-		if res == True:
-			return True
+			# set transition between, a class of characters being a single
+			# transition
+			chars = getClassChars(expression)
+			startNode.transitions.append((endNode, expression if chars is None else chars))
 
-	return False
+			res.append(endNode)
+			(first, last) = (startNode, endNode)
 
+	return res
 
+# Convert an AST to a position (Glushkov) automaton: a node for each atom
+# reading a character (the position), reached from the initial node and from
+# the positions it can follow, without any eps transition. The nodes of the
+# positions which can end a word are final, as is the initial node if the
+# regex accepts the empty word.
+def toPositionNFA(tree: ASTNode) -> list[NFANode]:
+	initialNode = NFANode()
+	graph = [initialNode]
+	# nullable, first and last positions of each subtree (a subtree shared by
+	# PLUS being handled once), labels of positions and positions following
+	# each position
+	info: dict[int, tuple[bool, list[NFANode], list[NFANode]]] = {}
+	labels: dict[NFANode, str | frozenset[str]] = {}
+	follow: dict[NFANode, dict[NFANode, None]] = {}
+
+	stack = [(tree, False)]
+	while len(stack) > 0:
+		(node, visited) = stack.pop()
+		if id(node) in info:
+			continue
+		if not visited and len(node.children) > 0:
+			stack.append((node, True))
+			for child in reversed(node.children):
+				stack.append((child, False))
+			continue
+
+		expression = node.data
+		if expression == "UNION":
+			(nullable1, first1, last1) = info[id(node.children[0])]
+			(nullable2, first2, last2) = info[id(node.children[1])]
+			info[id(node)] = (nullable1 or nullable2, first1 + first2, last1 + last2)
+		elif expression == "CONCAT":
+			(nullable1, first1, last1) = info[id(node.children[0])]
+			(nullable2, first2, last2) = info[id(node.children[1])]
+			for position in last1:
+				follow[position].update(dict.fromkeys(first2))
+			first = first1 + first2 if nullable1 else first1
+			last = last1 + last2 if nullable2 else last2
+			info[id(node)] = (nullable1 and nullable2, first, last)
+		elif expression == "STAR":
+			(_, first, last) = info[id(node.children[0])]
+			for position in last:
+				follow[position].update(dict.fromkeys(first))
+			info[id(node)] = (True, first, last)
+		elif expression == "eps":
+			info[id(node)] = (True, [], [])
+		elif expression == "void":
+			info[id(node)] = (False, [], [])
+		else:
+			position = NFANode()
+			graph.append(position)
+			chars = getClassChars(expression)
+			labels[position] = expression if chars is None else chars
+			follow[position] = {}
+			info[id(node)] = (False, [position], [position])
+
+	(nullable, first, last) = info[id(tree)]
+	for position in dict.fromkeys(first):
+		initialNode.transitions.append((position, labels[position]))
+	for position in graph[1:]:
+		for nextPosition in follow[position]:
+			position.transitions.append((nextPosition, labels[nextPosition]))
+	for position in last:
+		position.isFinal = True
+	initialNode.isFinal = nullable
+	return graph
+
+# Compact form of an NFA, used by the DFA constructions and NFA.accepts. Nodes
+# are numbered from 0 (the initial node) and the transitions of node i are the
+# entries offsets[i]:offsets[i + 1] of targets and labels. Labels are interned,
+# labels[k] being an index in labelTable, whose first label is "eps". final is
+# a bitset of the final nodes and tokens holds the token of each final node.
+class CompactNFA:
+	def __init__(self, offsets: array.array, targets: array.array, labels: array.array,
+				labelTable: list[str | frozenset[str]], final: bytearray, tokens: dict[int, str]):
+		self.offsets = offsets
+		self.targets = targets
+		self.labels = labels
+		self.labelTable = labelTable
+		self.final = final
+		self.tokens = tokens
+
+	@property
+	def size(self) -> int:
+		return len(self.offsets) - 1
+
+	def isFinal(self, node: int) -> bool:
+		return (self.final[node >> 3] >> (node & 7)) & 1 == 1
+
+	# convert a graph of NFANodes, its first node being the initial one
+	@staticmethod
+	def fromGraph(graph: list[NFANode]) -> 'CompactNFA':
+		index = {node: i for i, node in enumerate(graph)}
+		labelIds: dict[str | frozenset[str], int] = {"eps": 0}
+		offsets = array.array("i", [0])
+		targets = array.array("i")
+		labels = array.array("i")
+		final = bytearray((len(graph) + 7) >> 3)
+		tokens: dict[int, str] = {}
+		for i, node in enumerate(graph):
+			for (nextNode, label) in node.transitions:
+				targets.append(index[nextNode])
+				labels.append(labelIds.setdefault(label, len(labelIds)))
+			offsets.append(len(targets))
+			if node.isFinal:
+				final[i >> 3] |= 1 << (i & 7)
+				tokens[i] = node.token
+		return CompactNFA(offsets, targets, labels, list(labelIds), final, tokens)
+
+	# Combine NFAs under a new initial node with eps transitions to theirs,
+	# the final nodes of each NFA accepting its token.
+	@staticmethod
+	def union(nfas: 'list[CompactNFA]', tokens: list[str]) -> 'CompactNFA':
+		labelIds: dict[str | frozenset[str], int] = {"eps": 0}
+		size = 1 + sum(nfa.size for nfa in nfas)
+		offsets = array.array("i", [0, len(nfas)])
+		targets = array.array("i")
+		labels = array.array("i", [0] * len(nfas))
+		final = bytearray((size + 7) >> 3)
+		finalTokens: dict[int, str] = {}
+		shift = 1
+		for nfa in nfas:
+			targets.append(shift)
+			shift += nfa.size
+		shift = 1
+		for (nfa, token) in zip(nfas, tokens):
+			labelMap = [labelIds.setdefault(label, len(labelIds)) for label in nfa.labelTable]
+			start = len(targets)
+			offsets.extend(offset + start for offset in nfa.offsets[1:])
+			targets.extend(target + shift for target in nfa.targets)
+			labels.extend(labelMap[label] for label in nfa.labels)
+			for node in nfa.tokens:
+				final[(node + shift) >> 3] |= 1 << ((node + shift) & 7)
+				finalTokens[node + shift] = token
+			shift += nfa.size
+		return CompactNFA(offsets, targets, labels, list(labelIds), final, finalTokens)
+
+	# Get the nodes having transitions on characters in the eps closure of
+	# some nodes, and whether a final node is in it. Nodes are marked with the
+	# generation of the closure, so that each one is visited once.
+	def getClosure(self, nodes: list[int], mark: list[int], generation: int) -> tuple[list[int], bool]:
+		offsets = self.offsets
+		targets = self.targets
+		labels = self.labels
+		moving = []
+		isFinal = False
+		stack = []
+		for node in nodes:
+			if mark[node] != generation:
+				mark[node] = generation
+				stack.append(node)
+		while len(stack) > 0:
+			node = stack.pop()
+			isFinal = isFinal or self.isFinal(node)
+			hasMoves = False
+			for k in range(offsets[node], offsets[node + 1]):
+				if labels[k] != 0:
+					hasMoves = True
+				elif mark[targets[k]] != generation:
+					mark[targets[k]] = generation
+					stack.append(targets[k])
+			if hasMoves:
+				moving.append(node)
+		return (moving, isFinal)
+
+	# Check if a word is accepted, going through it once with the set of the
+	# nodes reached so far (Thompson's simulation).
+	def accepts(self, word: str) -> bool:
+		offsets = self.offsets
+		targets = self.targets
+		labels = self.labels
+		labelTable = self.labelTable
+		mark = [-1] * self.size
+		(current, isFinal) = self.getClosure([0], mark, 0)
+		for (position, char) in enumerate(word, 1):
+			nextNodes = []
+			for node in current:
+				for k in range(offsets[node], offsets[node + 1]):
+					if labels[k] != 0 and labelMatches(labelTable[labels[k]], char):
+						nextNodes.append(targets[k])
+			(current, isFinal) = self.getClosure(nextNodes, mark, position)
+			if len(current) == 0 and not isFinal:
+				return False
+		return isFinal
 
 class NFA(Generic[S]):
 	def __init__(self, graph):
 		# NFANode.newid = itertools.count() # reset id count for each new NFA
 		self.graph: list[NFANode] = graph
+		# compact form of the graph, built by the first call of NFA.accepts
+		self.compact: CompactNFA = None
 
 	def map(self, f: Callable[[S], T]) -> 'NFA[T]':
-		graph2 = copy.deepcopy(self.graph)
+		# copy the nodes one by one (a deep copy would recurse along the
+		# transitions), then their transitions
+		copies = {node: copy.copy(node) for node in self.graph}
+		graph2 = list(copies.values())
 		for node in graph2:
+			node.transitions = [(copies[nextNode], label) for (nextNode, label) in node.transitions]
 			# apply function for each id in copy of NFA graph
 			node.id = f(node.id)
 		return NFA(graph2)
@@ -217,7 +438,7 @@ class NFA(Generic[S]):
 		# Iterate through all transitions and add to set these which are on
 		# required character.
 		for transition in state.transitions:
-			if transition[1] == on_chr:
+			if transition[1] != "eps" and labelMatches(transition[1], on_chr):
 				res.add(transition[0].id)
 
 		return res
@@ -230,8 +451,9 @@ class NFA(Generic[S]):
 		return res
 
 	def accepts(self, str: str) -> bool:
-		# call helper function
-		return NFAAccept(self.graph, self.graph[0], str)
+		if self.compact is None:
+			self.compact = CompactNFA.fromGraph(self.graph)
+		return self.compact.accepts(str)
 
 	def isFinal(self, state: S) -> bool:
 		# NEW for stage 3 -- final state check based on new member variable
@@ -240,9 +462,15 @@ class NFA(Generic[S]):
 				return True
 		return False
 
+	# construction is "thompson" (eps transitions, the last node being the
+	# only final one) or "glushkov" (no eps transitions, see toPositionNFA)
 	@staticmethod
-	def fromPrenex(str: str) -> 'NFA[int]':
-		
+	def fromPrenex(str: str, construction: str = "thompson") -> 'NFA[int]':
+		if construction == "glushkov":
+			return NFA(toPositionNFA(toAST(mySplit(str))[0]))
+		if construction != "thompson":
+			raise ValueError(f"unknown NFA construction {construction}")
+
 		# call helper functions
 		graph = toNFA(toAST(mySplit(str))[0])
 		graph[-1].isFinal = True # NEW for stage 3, mark the last state as final
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from builtins import print
-from src.Regex import Character, Operator
+from src.Regex import Character, CharacterClass, Operator
 
 # checks if CONCAT is implied between given two characters and/or operators
 def insertConcat(prev, current):
@@ -8,31 +8,33 @@ def insertConcat(prev, current):
     singleOperand = ["STAR", "PLUS", "MAYBE"]
     # if both are characters
     # ex. "ab"
-    if type(prev) == type(current) == Character:
+    if isinstance(prev, Character) and isinstance(current, Character):
         return True
     # if first is ")" and next is character or "("
     # ex. "(a|b)(c|d)" or "(a|b)c"
     if prev == Operator(")") and \
-        (type(current) is Character or current == Operator("(")):
+        (isinstance(current, Character) or current == Operator("(")):
         return True
     # if first is character and next is "("
     # ex. "a(b|c)"
-    if type(prev) is Character and current == Operator("("):
+    if isinstance(prev, Character) and current == Operator("("):
         return True
     # if first is operator which takes one operand and next is character or "("
     # ex. "a*b" or "a+(b|c)"
     if (type(prev) is Operator and prev.op in singleOperand) and \
-        (type(current) is Character or current == Operator("(")):
+        (isinstance(current, Character) or current == Operator("(")):
         return True
     return False
     
+# Operands are kept as lists of words and of other operands, joined once by
+# joinSubex, so that combining sub-expressions does not copy them.
 def combineSubex(operators: list, operands: list):
     singleOperand = ["STAR", "PLUS", "MAYBE"]
 
     operator = operators.pop() # pop operator from stack
     # In prefix notation, operator should be first in the string of
     # sub-expression.
-    tmp = operator.op + " "
+    tmp = [operator.op]
 
     operand1 = operands.pop() # pop operand from top of the stack
     # If whitespace, enclose in apostrophes so mySplit function from NFA will
@@ -45,12 +47,24 @@ def combineSubex(operators: list, operands: list):
         operand2 = operands.pop()
         # if operand2 == " ":
         #     operand2 = "'" + operand2 + "'"
-        tmp += operand2 + " "
+        tmp.append(operand2)
     
     # first extracted operand should be written second, because of the stack
-    tmp += operand1 
+    tmp.append(operand1)
 
-    operands.append(tmp) # append the result string in operand stack
+    operands.append(tmp) # append the result in operand stack
+
+# join the words of an operand, separated by spaces
+def joinSubex(operand) -> str:
+    words = []
+    stack = [operand]
+    while len(stack) > 0:
+        operand = stack.pop()
+        if isinstance(operand, str):
+            words.append(operand)
+        else:
+            stack.extend(reversed(operand))
+    return " ".join(words)
 
 class Parser:
     # This function should:
@@ -76,18 +90,12 @@ class Parser:
         while i < len(regex):
             tmp = []
             char = regex[i]
-            # expand square brackets syntactic sugars
+            # square brackets syntactic sugars are kept as a single atom
             if char == "[":
                 fromChar = regex[i + 1]
                 toChar = regex[i + 3]
-                tmp.append(Operator("("))
                 i += 4 # skip the 'cursor' to after the syntactic sugar
-                for j in range(ord(fromChar), ord(toChar) + 1):
-                    tmp.append(Character(chr(j)))
-                    tmp.append(Operator(prenexName["|"]))
-                tmp = tmp[:-1]
-                tmp.append(Operator(")"))
-                res += tmp
+                res.append(CharacterClass([(fromChar, toChar)]))
             # if character is between apostrophes ex. 'c'
             elif char == "'":
                 # if two consecutive apostrophes
@@ -146,12 +154,12 @@ class Parser:
                 prev = None
                 current = Operator("CONCAT")
                 i -= 1 # stay at the same position of input regex
-            if type(current) is Character:
+            if isinstance(current, Character):
                 tmp = current.chr
                 # NEW for stage 3 -- enclose whitespace here
                 # If whitespace, enclose in apostrophes so mySplit function
                 # from NFA will work properly.
-                if tmp == " ":
+                if " " in tmp:
                     tmp = "'" + tmp + "'"
                 operands.append(tmp)
             else:
@@ -184,4 +192,4 @@ class Parser:
             combineSubex(operators, operands)
         
         # final result is on top of the 'stack'
-        return operands[-1]
+        return joinSubex(operands[-1])
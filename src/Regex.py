@@ -19,6 +19,23 @@ class Character:
             return self.chr == other.chr
         return False
 
+# A class of characters, such as [a-z], kept as a single atom. Its chr is the
+# prenex spelling of the class.
+class CharacterClass(Character):
+    __match_args__ = ("ranges",)
+
+    def __init__(self, ranges: list[tuple[str, str]]):
+        self.ranges = ranges
+        super().__init__("[" + "".join(f"{first}-{last}" for (first, last) in ranges) + "]")
+
+    def __str__(self) -> str:
+        return f"Class {self.chr}"
+
+    def __eq__(self, other):
+        if isinstance(other, CharacterClass):
+            return self.ranges == other.ranges
+        return False
+
 class Operator:
     __match_args__ = ("op",)    
 
@@ -1,6 +1,9 @@
 from typing import Callable
 import unittest
-from src.DFA import DFA
+import importlib.util
+from src.DFA import DFA, toDFA, minimizeDFA
+from src.NFA import NFA, NFANode
+from src.Parser import Parser
 
 
 class DFATests(unittest.TestCase):
@@ -161,3 +164,51 @@ class DFATests(unittest.TestCase):
 
 					self.assertEqual(f(originalNext), mappedNext)
 
+
+	def test_dfa_next_and_final(self):
+		dfa = DFA.fromPrenex("CONCAT a STAR b")
+		state = dfa.next(dfa.next(0, "a"), "b")
+		self.assertTrue(dfa.isFinal(state))
+		self.assertFalse(dfa.isFinal(0))
+		self.assertIsNone(dfa.next(0, "c"))
+		self.assertEqual(len(dfa.table.transitions), dfa.table.size * dfa.table.width)
+
+	def test_dfa_char_classes(self):
+		table = toDFA(NFA.fromPrenex(Parser.toPrenex("[a-z]+|[0-9]")).graph)
+		# letters and digits
+		self.assertEqual(table.width, 2)
+		self.assertEqual(table.columns["a"], table.columns["q"])
+		self.assertNotEqual(table.columns["a"], table.columns["0"])
+
+	def test_dfa_unique_groups(self):
+		table = toDFA(NFA.fromPrenex("STAR UNION CONCAT a b CONCAT b STAR a").graph)
+		# one state per distinct NFA group: the initial one, which "ab" leads
+		# back to, then after "a", after "b", after "ba" and the sink
+		self.assertEqual(table.size, 5)
+
+	def test_dfa_long_eps_chain(self):
+		# longer than the default recursion limit
+		graph = [NFANode() for _ in range(5000)]
+		for node, nextNode in zip(graph, graph[1:]):
+			node.transitions.append((nextNode, "eps"))
+		graph[-1].transitions.append((graph[0], "a"))
+		graph[-1].isFinal = True
+		dfa = DFA(toDFA(graph))
+		self.assertTrue(dfa.accepts(""))
+		self.assertTrue(dfa.accepts("aaa"))
+
+	def test_dfa_minimize(self):
+		table = toDFA(NFA.fromPrenex("UNION CONCAT a STAR b CONCAT a STAR b").graph)
+		minimized = minimizeDFA(table)
+		# the initial state, "a b*" and the sink
+		self.assertEqual(minimized.size, 3)
+		for word in ["", "a", "ab", "abbb", "b", "aba"]:
+			self.assertEqual(DFA(table).accepts(word), DFA(minimized).accepts(word))
+
+	@unittest.skipIf(importlib.util.find_spec("numpy") is None, "numpy is not installed")
+	def test_dfa_accepts_many(self):
+		dfa = DFA.fromPrenex("CONCAT [a-z] STAR UNION [a-z] [0-9]")
+		words = ["a", "ab1", "", "1a", "abc_", "z9z9", "a\0", "é", "x" * 100]
+		self.assertEqual(dfa.accepts_many(words).tolist(), [dfa.accepts(word) for word in words])
+		self.assertEqual(dfa.accepts_many([]).tolist(), [])
+		self.assertEqual(dfa.accepts_many(["", ""]).tolist(), [False, False])
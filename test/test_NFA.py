@@ -1,5 +1,6 @@
 import unittest
-from src.NFA import NFA
+from src.NFA import NFA, CompactNFA
+from src.Parser import Parser
 
 
 class NFATests(unittest.TestCase):
@@ -137,3 +138,61 @@ class NFATests(unittest.TestCase):
 					self.assertSetEqual(set(map(f, originalNext)), mappedNext)
 
 
+
+	def test_nfa_char_class(self):
+		nfa = NFA.fromPrenex("CONCAT [a-z] STAR [0-9]")
+		# a single transition for each class
+		self.assertEqual(len(nfa.graph), 6)
+		self.assertTrue(nfa.accepts("q"))
+		self.assertTrue(nfa.accepts("x2023"))
+		self.assertFalse(nfa.accepts("2023"))
+
+	def test_nfa_set_simulation(self):
+		# eps cycles and long words, which the recursive search could not handle
+		nfa = NFA.fromPrenex("STAR STAR a")
+		self.assertTrue(nfa.accepts(""))
+		self.assertTrue(nfa.accepts("a" * 5000))
+		self.assertFalse(nfa.accepts("a" * 5000 + "b"))
+
+		# exponential for backtracking
+		nfa = NFA.fromPrenex("CONCAT STAR UNION a CONCAT a a b")
+		self.assertFalse(nfa.accepts("a" * 40))
+		self.assertTrue(nfa.accepts("a" * 40 + "b"))
+
+	def test_nfa_glushkov(self):
+		for prenex in ["UNION a STAR b", "CONCAT PLUS CONCAT a b MAYBE c", "STAR STAR a", "CONCAT STAR UNION [a-c] eps x", "void"]:
+			thompson = NFA.fromPrenex(prenex)
+			glushkov = NFA.fromPrenex(prenex, "glushkov")
+			# a node for each atom and the initial one, without eps transitions
+			self.assertLessEqual(len(glushkov.graph), len(thompson.graph))
+			for node in glushkov.graph:
+				self.assertNotIn("eps", [label for (_, label) in node.transitions])
+			for word in ["", "a", "b", "bb", "abab", "ababc", "abc", "aaa", "x", "cbx", "dx"]:
+				self.assertEqual(glushkov.accepts(word), thompson.accepts(word))
+		self.assertEqual(len(NFA.fromPrenex("CONCAT PLUS CONCAT a b MAYBE c", "glushkov").graph), 4)
+
+	def test_nfa_long_regex(self):
+		# deeper than the recursion limit
+		for regex in ["a" * 2000, "(" * 2000 + "a" + ")" * 2000, "|".join(["ab"] * 2000)]:
+			nfa = NFA.fromPrenex(Parser.toPrenex(regex))
+			self.assertTrue(nfa.accepts(regex.strip("()").split("|")[0]))
+			self.assertFalse(nfa.accepts("b"))
+		mapped = nfa.map(lambda id: id + 1)
+		self.assertTrue(mapped.accepts("ab"))
+		self.assertEqual(mapped.getStates(), {id + 1 for id in nfa.getStates()})
+
+	def test_nfa_compact(self):
+		nfa = NFA.fromPrenex("CONCAT UNION a [a-c] STAR b")
+		compact = CompactNFA.fromGraph(nfa.graph)
+		self.assertEqual(compact.size, len(nfa.graph))
+		self.assertEqual(len(compact.targets), sum(len(node.transitions) for node in nfa.graph))
+		# "eps", "a", "[a-c]" and "b"
+		self.assertEqual(len(compact.labelTable), 4)
+		self.assertEqual([compact.isFinal(i) for i in range(compact.size)], [node.isFinal for node in nfa.graph])
+
+		other = CompactNFA.fromGraph(NFA.fromPrenex("CONCAT c b", "glushkov").graph)
+		union = CompactNFA.union([compact, other], ["AB", "CB"])
+		self.assertEqual(union.size, 1 + compact.size + other.size)
+		self.assertEqual(sorted(set(union.tokens.values())), ["AB", "CB"])
+		for word in ["a", "cbb", "cb", "b", "ac", ""]:
+			self.assertEqual(union.accepts(word), nfa.accepts(word) or word == "cb")
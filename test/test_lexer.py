@@ -1,7 +1,24 @@
 import unittest
-import json, os
+import io, json, os, random, tempfile, functools
 from src.DFA import DFA
-from src.Lex import Lexer
+from src.Lex import Lexer, LexerError, IncrementalLexer, LexerCache
+
+with open("src/configuration.json") as f:
+    CONFIGURATION = json.load(f)
+
+def progPaths():
+    return [os.path.join("test/prog_tests", file) for file in sorted(os.listdir("test/prog_tests"))]
+
+def progTexts():
+    for path in progPaths():
+        with open(path, 'r') as f:
+            yield f.read()
+
+# the lexer of the example language, which the other engines are checked
+# against
+@functools.lru_cache(maxsize=None)
+def referenceLexer():
+    return Lexer(CONFIGURATION)
 
 class RegexParseTests(unittest.TestCase):
     def test_simple_lexer_concat(self):
@@ -192,3 +209,272 @@ class RegexParseTests(unittest.TestCase):
         self.assertTrue(results[7] == ['BEGIN', 'VARIABLE', 'ASSIGN', 'NUMBER', 'VARIABLE', 'ASSIGN', 'NUMBER', 'VARIABLE', 'ASSIGN', 'NUMBER', 'IF', 'OPEN_PARANTHESIS', 'VARIABLE', 'MINUS', 'VARIABLE', 'GREATER', 'NUMBER', 'CLOSE_PARANTHESIS', 'THEN', 'VARIABLE', 'ASSIGN', 'NUMBER', 'ELSE', 'BEGIN', 'WHILE', 'OPEN_PARANTHESIS', 'VARIABLE', 'MINUS', 'VARIABLE', 'GREATER', 'NUMBER', 'CLOSE_PARANTHESIS', 'DO', 'VARIABLE', 'ASSIGN', 'VARIABLE', 'PLUS', 'NUMBER', 'OD', 'VARIABLE', 'ASSIGN', 'MINUS', 'NUMBER', 'END', 'FI', 'END'])
 
         print("lexer for a real language (20p)")
+
+    def test_lazy_lexer(self):
+        lazyLexers = [Lexer(CONFIGURATION, lazy=True), Lexer(CONFIGURATION, lazy=True, cacheSize=3)]
+
+        for d in progTexts():
+            for lazyLexer in lazyLexers:
+                self.assertEqual(lazyLexer.lex(d), referenceLexer().lex(d))
+        self.assertTrue(lazyLexers[1].table.flushes > 0)
+
+        # a paused generator must not use the pairs it memoized once another
+        # one flushed the cache they share
+        s = {"T0": "((a|b)ba)+", "T1": "(a|a(a|b))", "T2": "b"}
+        lazyLexer = Lexer(s, lazy=True, cacheSize=6)
+        tokens = lazyLexer.iter_tokens("bbaaabbaabba")
+        first = [next(tokens) for _ in range(3)]
+        other = lazyLexer.iter_tokens("aaabb")
+        next(other), next(other)
+        self.assertEqual(first + list(tokens), Lexer(s).lex("bbaaabbaabba"))
+
+        s = {"SPACE": "' '", "ABC": "a(b+)c", "AS": "(a)+", "BCS": "(bc)+", "DORC": "(d|c)+"}
+        self.assertEqual(Lexer(s, lazy=True, cacheSize=3).lex("abcbcbcaabaad dccbca"), "No viable alternative at character 10, line 0")
+
+    def test_lexer_stream(self):
+        lexer = referenceLexer()
+
+        for d in progTexts():
+            expected = lexer.lex(d)
+            self.assertEqual(list(lexer.lex_stream(io.StringIO(d), 7)), expected)
+            self.assertEqual(list(lexer.lex_stream(d)), expected)
+            self.assertEqual(list(lexer.lex_stream([d[:10], "", d[10:]])), expected)
+
+        # tokens spanning chunks, and lexed again from an earlier chunk
+        lexer = Lexer({"A": "a", "AB": "a*b"})
+        for word in ["aaaaabaa", "aaaaa", "ab" * 20]:
+            self.assertEqual(list(lexer.lex_stream([word[i:i + 2] for i in range(0, len(word), 2)])), lexer.lex(word))
+            self.assertEqual(list(lexer.lex_stream(io.StringIO(word), 1)), lexer.lex(word))
+
+        lexer = Lexer({"NEWLINE": "'\n'", "ABC": "a(b+)c"})
+        tokens = lexer.lex_stream(["abc\n", "abbbbbc\na", "bb"])
+        self.assertEqual(next(tokens), ("ABC", "abc"))
+        with self.assertRaises(LexerError) as error:
+            list(tokens)
+        self.assertEqual(str(error.exception), "No viable alternative at character EOF, line 2")
+
+    def test_lexer_iter_tokens(self):
+        s = {"NEWLINE": "'\n'", "ABC": "a(b+)c"}
+
+        lexer = Lexer(s)
+
+        tokens = lexer.iter_tokens("abc\nabbc\nzzz")
+        self.assertEqual(next(tokens), ("ABC", "abc"))
+        self.assertEqual(next(tokens), ("NEWLINE", "\n"))
+        tokens.close()
+
+        with self.assertRaises(LexerError) as error:
+            for _ in lexer.iter_tokens("abc\nabbc\nzzz"):
+                pass
+        self.assertEqual((error.exception.position, error.exception.line, error.exception.column), (9, 2, 1))
+        self.assertEqual(error.exception.message, lexer.lex("abc\nabbc\nzzz"))
+
+    def test_lexer_long_lookahead(self):
+        s = {"A": "a", "AB": "a*b"}
+
+        lexer = Lexer(s)
+
+        # every token looks ahead to the end of the word, which must not be
+        # scanned again for each token
+        self.assertEqual(lexer.lex("a" * 50000), [("A", "a")] * 50000)
+        self.assertEqual(lexer.lex("aaab" + "a" * 3), [("AB", "aaab")] + [("A", "a")] * 3)
+        self.assertEqual(Lexer(s, lazy=True, cacheSize=3).lex("aaaa"), [("A", "a")] * 4)
+
+    def test_lexer_offsets(self):
+        s = {"SPACE": "' '", "ZEROS": "0+"}
+
+        lexer = Lexer(s)
+
+        word = "0000 0"
+        offsets = lexer.lex_offsets(word)
+        self.assertEqual(offsets, [(1, 0, 4), (0, 4, 5), (1, 5, 6)])
+        self.assertEqual([(lexer.tokens[token], word[start:end]) for (token, start, end) in offsets], lexer.lex(word))
+        with self.assertRaises(LexerError):
+            lexer.lex_offsets("00a")
+
+    def test_lexer_positions(self):
+        lexer = Lexer({"WORD": "[a-z]+", "SPACE": "' '", "NEWLINE": "'\n'"})
+
+        self.assertEqual(lexer.lex_offsets("ab c\n\nd", positions=True), [(0, 0, 2, 0, 0), (1, 2, 3, 0, 2), (0, 3, 4, 0, 3), (2, 4, 5, 0, 4), (2, 5, 6, 1, 0), (0, 6, 7, 2, 0)])
+        self.assertEqual(list(lexer.iter_tokens("ab\n c", positions=True)), [("WORD", "ab", 0, 0), ("NEWLINE", "\n", 0, 2), ("SPACE", " ", 1, 0), ("WORD", "c", 1, 1)])
+        word = "ab c\n\nd ef\ng\n\n hij k\n"
+        expected = [lexer.tokens[token:token + 1] + [word[start:end], line, column] for (token, start, end, line, column) in lexer.lex_offsets(word, positions=True)]
+        for size in [1, 2, 5]:
+            chunks = [word[i:i + size] for i in range(0, len(word), size)]
+            self.assertEqual([list(token) for token in lexer.lex_stream(chunks, positions=True)], expected)
+
+        # lines are indexed chunk by chunk, errors keep their legacy positions
+        with self.assertRaises(LexerError) as error:
+            list(lexer.lex_stream(["ab\nc", "d\n", "\nef", "G"]))
+        self.assertEqual(error.exception.message, "No viable alternative at character 3, line 3")
+        self.assertEqual(lexer.lex("ab\ncd\n\nefG"), "No viable alternative at character 3, line 3")
+
+    def test_lexer_file(self):
+        lexer = referenceLexer()
+
+        for path in progPaths():
+            with open(path, 'r') as f:
+                self.assertEqual(lexer.lex_file(path), lexer.lex_offsets(f.read()))
+
+        lexer = Lexer({"WORD": "[a-z]+", "ARROW": "→|->", "SPACE": "' '"})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "arrows.in")
+            with open(path, "wb") as f:
+                f.write("a → b -> c→".encode("utf-8"))
+            with open(path, "rb") as f:
+                data = f.read()
+            tokens = [(lexer.tokens[token], data[start:end].decode("utf-8")) for (token, start, end) in lexer.lex_file(path)]
+            self.assertEqual(tokens, lexer.lex("a → b -> c→"))
+            self.assertEqual(lexer.lex_file(path, positions=True)[-1], (1, 12, 15, 0, 12))
+
+            # a class spanning the surrogates, which are not in any file
+            lexer = Lexer({"ANY": "[!-\uffff]+", "SPACE": "' '"})
+            self.assertEqual([(lexer.tokens[token], data[start:end].decode("utf-8")) for (token, start, end) in lexer.lex_file(path)], lexer.lex("a → b -> c→"))
+
+    def test_incremental_lexer(self):
+        lexer = Lexer({"A": "a", "AB": "a*b", "SPACE": "' '", "NEWLINE": "'\n'"})
+        text = "aab a\nab"
+        incremental = IncrementalLexer(lexer, text)
+        self.assertEqual(incremental.offsets, lexer.lex_offsets(text))
+
+        rng = random.Random(13)
+        for _ in range(300):
+            offset = rng.randint(0, len(text))
+            removed = rng.randint(0, min(3, len(text) - offset))
+            inserted = "".join(rng.choice("aab \n") for _ in range(rng.randint(0, 3)))
+            text = text[:offset] + inserted + text[offset + removed:]
+            incremental.edit(offset, removed, inserted)
+            self.assertEqual(incremental.offsets, lexer.lex_offsets(text))
+
+        # a trailing run of "a" is lexed again once a "b" closes it
+        incremental = IncrementalLexer(lexer, "b aaaa")
+        self.assertEqual(incremental.edit(6, 0, "b"), (2, 4, 1))
+        self.assertEqual(incremental.offsets, [(1, 0, 1), (2, 1, 2), (1, 2, 7)])
+
+        with self.assertRaises(LexerError):
+            incremental.edit(0, 0, "c")
+        incremental.edit(0, 1, "")
+        self.assertEqual(incremental.offsets, lexer.lex_offsets("b aaaab"))
+
+        # the long first token looked far, but not as far as the edit
+        text = "a" * 20 + "b" + " a" * 5
+        incremental = IncrementalLexer(lexer, text)
+        self.assertEqual(incremental.edit(26, 1, "b"), (4, 3, 3))
+        self.assertEqual(incremental.offsets, lexer.lex_offsets(text[:26] + "b" + text[27:]))
+
+        # only the text from the edit on is lexed, errors still report lines
+        # counted from the start of the text
+        text = "ab\n" * 2000
+        incremental = IncrementalLexer(lexer, text)
+        with self.assertRaises(LexerError) as error:
+            incremental.edit(5000, 0, "c")
+        self.assertEqual(error.exception.message, lexer.lex(text[:5000] + "c" + text[5000:]))
+        self.assertEqual(error.exception.line, 1666)
+
+    def test_lexer_save_load(self):
+        lexer = Lexer.compile(CONFIGURATION)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "lexer.bin")
+            lexer.save(path)
+            loaded = Lexer.load(path)
+
+            self.assertEqual(loaded.tokens, lexer.tokens)
+            self.assertEqual(loaded.configurations, CONFIGURATION)
+            self.assertEqual(loaded.stateCounts, lexer.stateCounts)
+            for text in progTexts():
+                self.assertEqual(loaded.lex(text), lexer.lex(text))
+            self.assertEqual(loaded.lex("x = 1 ?"), lexer.lex("x = 1 ?"))
+
+            with open(path, "r+b") as f:
+                f.write(b"LEXR\xff\xff")
+            with self.assertRaises(ValueError):
+                Lexer.load(path)
+
+    def test_lexer_cache(self):
+        first = {"A": "a", "AB": "a*b"}
+        second = {"AB": "a*b", "A": "a"}
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = LexerCache(directory)
+            lexer = Lexer.compile(first, cache)
+            self.assertEqual(lexer.lex("aab a"), "No viable alternative at character 3, line 0")
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            # the order of the tokens is part of the key
+            self.assertNotEqual(cache.key(first), cache.key(second))
+            self.assertEqual(Lexer.compile(second, cache).tokens, ["AB", "A"])
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            loaded = Lexer.compile(first, cache)
+            self.assertEqual(loaded.tokens, ["A", "AB"])
+            self.assertEqual(loaded.lex("aaba"), [("AB", "aab"), ("A", "a")])
+
+            # only the most recently used lexer fits
+            cache = LexerCache(directory, os.path.getsize(cache.path(first)))
+            os.utime(cache.path(second), (0, 0))
+            Lexer.compile(first, cache)
+            cache.evict()
+            self.assertEqual(os.listdir(directory), [os.path.basename(cache.path(first))])
+
+    def test_lexer_generate(self):
+        lexer = referenceLexer()
+        module = {}
+        exec(compile(lexer.generate(), "<generated>", "exec"), module)
+        for text in progTexts():
+            self.assertEqual(module["lex"](text), lexer.lex(text))
+            self.assertEqual(module["lex_offsets"](text), lexer.lex_offsets(text))
+
+        lexer = Lexer({"A": "a", "AB": "a*b", "NEWLINE": "'\n'"})
+        module = {}
+        exec(lexer.generate(), module)
+        for word in ["", "aab\na", "a\naaaa", "ab\nc", "a" * 1000]:
+            self.assertEqual(module["lex"](word), lexer.lex(word))
+
+    def test_lexer_parallel(self):
+        lexer = Lexer({"LINES": "(a|'\n')+b", "A": "a", "NEWLINE": "'\n'", "SPACE": "' '"})
+
+        rng = random.Random(18)
+        for _ in range(20):
+            word = "".join(rng.choice(["a", "a", " ", "\n", "\n", "b"]) for _ in range(rng.randint(1, 200)))
+            word = word.replace(" b", " ").replace("\nb\n", "\n")
+            try:
+                expected = lexer.lex_offsets(word, positions=True)
+            except LexerError as error:
+                with self.assertRaises(LexerError) as parallelError:
+                    lexer.lex_parallel(word, workers=2, chunkSize=16)
+                self.assertEqual(parallelError.exception.message, error.message)
+                continue
+            self.assertEqual(lexer.lex_parallel(word, workers=2, chunkSize=16, positions=True), expected)
+            self.assertEqual(lexer.lex_parallel(word, workers=2, chunkSize=16, sync=" "), lexer.lex_offsets(word))
+
+    def test_lexer_many(self):
+        lexer = Lexer({"A": "a", "AB": "a*b", "SPACE": "' '"})
+        docs = ["aab a", "ab", "b a", "aac", "", "a" * 50] * 10
+
+        expected = [lexer.lex(doc) for doc in docs]
+        self.assertEqual(list(lexer.lex_many(docs, workers=2, batchSize=4)), expected)
+        self.assertEqual(list(lexer.lex_many(iter(docs), workers=1)), expected)
+
+    def test_lexer_workers(self):
+        lexer = referenceLexer()
+        for workers in [1, 2]:
+            combined = Lexer(CONFIGURATION, workers=workers)
+            self.assertEqual(combined.tokens, lexer.tokens)
+            self.assertEqual(combined.table.size, lexer.table.size)
+            for text in progTexts():
+                self.assertEqual(combined.lex(text), lexer.lex(text))
+            self.assertEqual(combined.lex("x = 1 ?"), lexer.lex("x = 1 ?"))
+
+        s = {"smallA": "a", "bigA": "aaaa", "AB": "a*b", "SPACE": "' '"}
+        with self.assertRaises(ValueError):
+            Lexer(s, lazy=True, workers=1)
+        combined = Lexer(s, workers=1)
+        for word in ["aaaaaa", "aab aaaab", "aaa c", "", "b a"]:
+            self.assertEqual(combined.lex(word), Lexer(s).lex(word))
+
+    def test_lexer_glushkov(self):
+        lexer = referenceLexer()
+        for glushkov in [Lexer(CONFIGURATION, construction="glushkov"), Lexer(CONFIGURATION, workers=1, construction="glushkov"), Lexer(CONFIGURATION, lazy=True, construction="glushkov")]:
+            for text in progTexts():
+                self.assertEqual(glushkov.lex(text), lexer.lex(text))
+        self.assertEqual(Lexer(CONFIGURATION, construction="glushkov").table.size, lexer.table.size)
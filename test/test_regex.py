@@ -327,3 +327,9 @@ class RegexParseTests(unittest.TestCase):
         self.assertTrue(DFA.fromPrenex(s).accepts("07cdda "))
         self.assertFalse(DFA.fromPrenex(s).accepts("07bcdda "))
         print("all (6p)")
+
+    def test_class_atom(self):
+        self.assertEqual(Parser.toPrenex("[a-z]"), "[a-z]")
+        self.assertEqual(Parser.toPrenex("a[0-9]*"), "CONCAT a STAR [0-9]")
+        self.assertEqual(Parser.toPrenex("[ -~]"), "'[ -~]'")
+        self.assertTrue(DFA.fromPrenex(Parser.toPrenex("[ -~]+")).accepts("a b~"))